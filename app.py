@@ -1,22 +1,33 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, jsonify, request, render_template, g
 from flask_cors import CORS
 from flask_admin import Admin
 from flask_admin.contrib.sqla import ModelView
-from sqlalchemy import create_engine
+from sqlalchemy import tuple_
 from sqlalchemy.orm import sessionmaker
-from models import User, Product, OrderItem, Order
+from models import User, Product, OrderItem, Order, OrderStatusCount, NotificationOutbox
 from config import config
-import asyncio
-import httpx
-from bot import EcommerceBot
+from db_engine import create_db_engine
+import json
+import time
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from localization import locales
+from notifier import NotificationWorker
+import metrics
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key_here'  # Required for Flask-Admin sessions
 CORS(app, origins='*')  # Enable CORS for all domains
 
 # Database connection
-engine = create_engine('sqlite:///shop.db')
+engine = create_db_engine()
 Session = sessionmaker(bind=engine)
+metrics.instrument_engine(engine, 'web')
 
 # Initialize Flask-Admin
 admin = Admin(app, name="Shop Admin", template_mode="bootstrap4")
@@ -27,61 +38,125 @@ admin.add_view(ModelView(Product, Session()))
 admin.add_view(ModelView(OrderItem, Session()))
 admin.add_view(ModelView(User, Session()))
 
-# Global HTTP client
-http_client = httpx.AsyncClient()
-bot_app = EcommerceBot()
-
-async def send_notification(user_id: int, message: str):
-    try:
-        url = f"https://api.telegram.org/bot{config.BOT_TOKEN}/sendMessage"
-        data = {"chat_id": user_id, "text": message, "parse_mode": "HTML"}
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data)
-            response.raise_for_status()
-    except Exception as e:
-        print(f"Ошибка при отправке уведомления: {e}")
+# Уведомления отправляются в фоне из notification_outbox. Воркер запускается
+# при импорте, чтобы работать и под gunicorn/uwsgi; несколько процессов
+# не мешают друг другу (уведомления захватываются арендой).
+# NOTIFY_WORKER_ENABLED=0 - отправляет отдельный процесс: python notifier.py
+notification_worker = NotificationWorker(Session)
+if config.NOTIFY_WORKER_ENABLED:
+    notification_worker.start()
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.HTTP_DURATION.observe(time.perf_counter() - started, endpoint=request.endpoint or 'unknown')
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return app.response_class(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.route('/_admin/order/')
 def index():
     return render_template('index.html')
 
+def json_response(data):
+    """JSON-ответ через orjson, если он установлен"""
+    if orjson is not None:
+        body = orjson.dumps(data)
+    else:
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return app.response_class(body, mimetype='application/json')
+
+
+def encode_cursor(order):
+    """Курсор страницы: позиция последнего заказа в порядке (created_at, id)"""
+    return f"{order.created_at.isoformat()}_{order.id}"
+
+
+def decode_cursor(cursor: str):
+    created_at_raw, order_id_raw = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(created_at_raw), int(order_id_raw)
+
+
 @app.route('/api/orders', methods=['GET'])
 def get_orders():
     session = Session()
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 5))
+        try:
+            page = int(request.args.get('page', 1))
+            per_page = int(request.args.get('per_page', 5))
+        except ValueError:
+            return jsonify({"success": False, "message": "page и per_page должны быть числами"}), 400
         status_filter = request.args.get('status', 'all')
-
-        query = session.query(Order)
+        cursor = request.args.get('cursor')
+
+        # Страницы загружаются только по cursor из предыдущего ответа (next_cursor);
+        # page - лишь номер для отображения, перейти к странице по номеру нельзя
+        if page > 1 and not cursor:
+            return jsonify({"success": False, "message": "Для page > 1 нужен cursor из next_cursor"}), 400
+
+        # Только нужные колонки, без загрузки ORM-объектов
+        query = session.query(
+            Order.id,
+            Order.name,
+            Order.phone,
+            Order.address,
+            Order.total_amount,
+            Order.status,
+            Order.created_at
+        )
 
         if status_filter != 'all':
             query = query.filter(Order.status == status_filter)
 
-        total_orders = query.count()
+        # Keyset-пагинация: продолжаем после последнего заказа предыдущей страницы
+        if cursor:
+            try:
+                created_at, order_id = decode_cursor(cursor)
+            except ValueError:
+                return jsonify({"success": False, "message": "Неверный формат cursor"}), 400
+            query = query.filter(tuple_(Order.created_at, Order.id) < tuple_(created_at, order_id))
 
-        orders = query.order_by(Order.created_at.desc()) \
-                      .offset((page - 1) * per_page) \
-                      .limit(per_page) \
+        orders = query.order_by(Order.created_at.desc(), Order.id.desc()) \
+                      .limit(per_page + 1) \
                       .all()
+        has_next = len(orders) > per_page
+        orders = orders[:per_page]
 
-        orders_list = []
-        for order in orders:
-            items = []
-            for item in order.items:
-                # Безопасная проверка
-                if item.product is not None:
-                    product_name = item.product.name_ru
-                else:
-                    product_name = "Неизвестный продукт"
-
-                items.append({
-                    'product_name': product_name,
+        # Общее количество берем из счетчиков, а не из COUNT(*)
+        counts = session.query(OrderStatusCount)
+        if status_filter != 'all':
+            counts = counts.filter(OrderStatusCount.status == status_filter)
+        total_orders = sum(row.count for row in counts)
+
+        # Позиции всех заказов страницы вместе с названиями товаров одним запросом
+        items_by_order = {order.id: [] for order in orders}
+        if items_by_order:
+            items = session.query(
+                OrderItem.order_id,
+                OrderItem.quantity,
+                OrderItem.price,
+                Product.name_ru
+            ).outerjoin(Product, Product.id == OrderItem.product_id) \
+             .filter(OrderItem.order_id.in_(list(items_by_order))) \
+             .order_by(OrderItem.id)
+
+            for item in items:
+                items_by_order[item.order_id].append({
+                    # Товар мог быть удален
+                    'product_name': item.name_ru if item.name_ru is not None else "Неизвестный продукт",
                     'quantity': item.quantity,
                     'price': item.price
                 })
 
-            orders_list.append({
+        orders_list = [
+            {
                 'id': order.id,
                 'user_name': order.name,
                 'phone': order.phone,
@@ -89,15 +164,18 @@ def get_orders():
                 'total_amount': order.total_amount,
                 'status': order.status,
                 'created_at': order.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'items': items
-            })
+                'items': items_by_order[order.id]
+            }
+            for order in orders
+        ]
 
-        return jsonify({
+        return json_response({
             "orders": orders_list,
             "total_orders": total_orders,
             "current_page": page,
             "per_page": per_page,
-            "has_next": (page * per_page) < total_orders
+            "has_next": has_next,
+            "next_cursor": encode_cursor(orders[-1]) if has_next else None
         })
 
     finally:
@@ -129,9 +207,9 @@ def get_orders():
 #             #     'cancelled': f'❌ Ваш заказ №{order_id} отменен'
 #             # }
 #             status_messages = {
-#                 'processing': lambda lang, order_id: bot_app.get_text(lang, 'status_processing').format(order_id=order_id),
-#                 'delivered': lambda lang, order_id: bot_app.get_text(lang, 'status_delivered').format(order_id=order_id),
-#                 'cancelled': lambda lang, order_id: bot_app.get_text(lang, 'status_cancelled').format(order_id=order_id),
+#                 'processing': lambda lang, order_id: locales.get_text(lang, 'status_processing').format(order_id=order_id),
+#                 'delivered': lambda lang, order_id: locales.get_text(lang, 'status_delivered').format(order_id=order_id),
+#                 'cancelled': lambda lang, order_id: locales.get_text(lang, 'status_cancelled').format(order_id=order_id),
 #             }
 
 
@@ -184,15 +262,15 @@ def get_orders():
 #                 lang = 'ru'  # Если язык не найден, по умолчанию используем 'ru'
 
 #             status_messages = {
-#                 'processing': lambda lang, order_id: bot_app.get_text(lang, 'status_processing').format(order_id=order_id),
-#                 'delivered': lambda lang, order_id: bot_app.get_text(lang, 'status_delivered').format(order_id=order_id),
-#                 'cancelled': lambda lang, order_id: bot_app.get_text(lang, 'status_cancelled').format(order_id=order_id),
+#                 'processing': lambda lang, order_id: locales.get_text(lang, 'status_processing').format(order_id=order_id),
+#                 'delivered': lambda lang, order_id: locales.get_text(lang, 'status_delivered').format(order_id=order_id),
+#                 'cancelled': lambda lang, order_id: locales.get_text(lang, 'status_cancelled').format(order_id=order_id),
 #             }
 
 #             # Получаем сообщение, вызывая функцию лямбда
 #             message = status_messages.get(
 #                 new_status,
-#                 lambda lang, order_id: bot_app.get_text(lang, 'status_default').format(order_id=order_id)  # Default message
+#                 lambda lang, order_id: locales.get_text(lang, 'status_default').format(order_id=order_id)  # Default message
 #             )(lang, order_id)  # Передаем параметры в лямбда-функцию
 
 #             order.status = new_status
@@ -241,25 +319,24 @@ def change_status():
                 lang = 'ru'  # Если пользователь не найден, по умолчанию используем 'ru'
 
             status_messages = {
-                'processing': lambda lang, order_id: bot_app.get_text(lang, 'status_processing').format(order_id=order_id),
-                'delivered': lambda lang, order_id: bot_app.get_text(lang, 'status_delivered').format(order_id=order_id),
-                'cancelled': lambda lang, order_id: bot_app.get_text(lang, 'status_cancelled').format(order_id=order_id),
+                'processing': lambda lang, order_id: locales.get_text(lang, 'status_processing').format(order_id=order_id),
+                'delivered': lambda lang, order_id: locales.get_text(lang, 'status_delivered').format(order_id=order_id),
+                'cancelled': lambda lang, order_id: locales.get_text(lang, 'status_cancelled').format(order_id=order_id),
             }
 
             # Получаем сообщение, вызывая функцию лямбда
             message = status_messages.get(
                 new_status,
-                lambda lang, order_id: bot_app.get_text(lang, 'status_default').format(order_id=order_id)  # Default message
+                lambda lang, order_id: locales.get_text(lang, 'status_default').format(order_id=order_id)  # Default message
             )(lang, order_id)  # Передаем параметры в лямбда-функцию
 
             order.status = new_status
-            session.commit()
 
+            # Уведомление пишем в outbox в той же транзакции, отправит его воркер
             if user and user.telegram_id:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(send_notification(user.telegram_id, message))
-                loop.close()
+                session.add(NotificationOutbox(chat_id=user.telegram_id, text=message, parse_mode='HTML'))
+            session.commit()
+            notification_worker.notify()
 
             return jsonify({"success": True, "message": f"Статус заказа #{order_id} изменен на {new_status}"})
 
@@ -267,7 +344,7 @@ def change_status():
             return jsonify({"success": False, "message": "Заказ не найден или заказ уже в данном статусе!"}), 404
 
     except Exception as e:
-        logging.error(f"Error: {e}")
+        logging.error("Error: %s", e)
         session.rollback()
         return jsonify({"success": False, "message": str(e)}), 500
     finally:
@@ -0,0 +1,87 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import config
+from database import Database
+from metrics import DB_EXECUTOR_WAIT, call_db_method
+from write_coalescer import WriteCoalescer
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase:
+    """Асинхронная обёртка над Database.
+
+    Повторяет методы Database (get_cart, add_to_cart, create_order и т.д.),
+    но каждый вызов выполняется в ограниченном пуле потоков, поэтому медленный
+    коммит SQLite не блокирует event loop и остальные чаты.
+    При max_workers=0 вызовы выполняются прямо в корутине (синхронный режим).
+    При write_batch=True операции Database.BATCHABLE_WRITES разных пользователей
+    коммитятся пакетами через WriteCoalescer.
+    """
+
+    def __init__(self, db: Database = None, max_workers: int = None, write_batch: bool = None):
+        self.db = db or Database()
+        if max_workers is None:
+            max_workers = config.DB_EXECUTOR_WORKERS
+        self.max_workers = max_workers
+        self._executor = None
+        if max_workers > 0:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix='db'
+            )
+        self._methods = {}
+        if write_batch is None:
+            write_batch = config.DB_WRITE_BATCH
+        self._coalescer = WriteCoalescer(self) if write_batch else None
+        logger.info("Async database initialized with %s workers, write batching %s",
+                    max_workers, 'on' if write_batch else 'off')
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнение синхронной функции в пуле потоков БД"""
+        if self._executor is None:
+            return call_db_method(func, *args, **kwargs)
+
+        queued_at = time.perf_counter()
+
+        def call():
+            DB_EXECUTOR_WAIT.observe(time.perf_counter() - queued_at)
+            return call_db_method(func, *args, **kwargs)
+
+        # Копия контекста нужна, чтобы счетчик SQL-запросов обновления
+        # (metrics._sql_counter) был виден в потоке БД
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, contextvars.copy_context().run, call)
+
+    def __getattr__(self, name):
+        # Вызывается только для атрибутов, которых нет у самой обёртки
+        if name in ('db', '_methods', '_coalescer'):
+            raise AttributeError(name)
+        attr = getattr(self.db, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+
+        method = self._methods.get(name)
+        if method is None:
+            if self._coalescer is not None and name in self.db.BATCHABLE_WRITES:
+                @functools.wraps(attr)
+                async def method(*args, **kwargs):
+                    return await self._coalescer.submit(name, *args, **kwargs)
+            else:
+                @functools.wraps(attr)
+                async def method(*args, **kwargs):
+                    return await self.run(attr, *args, **kwargs)
+            self._methods[name] = method
+        return method
+
+    def close(self):
+        """Остановка пула потоков и запись отложенных изменений Database"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.db.close()
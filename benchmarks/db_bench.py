@@ -0,0 +1,285 @@
+"""Микробенчмарки слоя БД на объемах продакшена.
+
+Заполняет SQLite-файл (по умолчанию 100k пользователей, 1M заказов,
+корзины у нескольких тысяч пользователей), замеряет методы Database и
+запрос /api/orders из app.py и пишет результаты в JSON для сравнения прогонов.
+
+    python benchmarks/db_bench.py --output bench.json
+    python benchmarks/db_bench.py --scale 0.01        # быстрый прогон
+    python benchmarks/db_bench.py --db /tmp/big.db    # повторно использовать заполненную базу
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('BOT_TOKEN', '123456:BENCHMARK')
+os.environ.setdefault('NOTIFY_WORKER_ENABLED', '0')
+os.environ.setdefault('LOG_FILE', '')
+
+from sqlalchemy import func, insert, select, text  # noqa: E402
+
+from database import Database  # noqa: E402
+from db_engine import create_db_engine  # noqa: E402
+from models import Cart, Order, OrderItem, OrderStatusCount, Product, User  # noqa: E402
+
+STATUSES = ('new', 'processing', 'delivered', 'cancelled')
+STATUS_WEIGHTS = (5, 10, 80, 5)
+CHUNK_SIZE = 50000
+
+
+def _insert_chunks(conn, table, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            conn.execute(insert(table), chunk)
+            chunk = []
+    if chunk:
+        conn.execute(insert(table), chunk)
+
+
+def seed(engine, users: int, orders: int, cart_users: int, products: int, seed_value: int):
+    """Заполнение базы через пакетные INSERT (без ORM, поэтому счетчики статусов
+    пересчитываются отдельно в конце)"""
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+
+    with engine.begin() as conn:
+        # Ускоряем заполнение: на время загрузки надежность записи не нужна.
+        # journal_mode не трогаем - база остается в WAL, как в продакшене
+        conn.exec_driver_sql('PRAGMA synchronous=OFF')
+
+        _insert_chunks(conn, Product.__table__, (
+            {'id': i + 1, 'name_ru': f'Вода {i}', 'name_uz': f'Suv {i}', 'description_ru': 'Питьевая вода',
+             'description_uz': 'Ichimlik suvi', 'price': 10000 + i * 1000, 'photo_id': f'photo{i}',
+             'is_promo': i == 0}
+            for i in range(products)
+        ))
+        prices = {i + 1: 10000 + i * 1000 for i in range(products)}
+
+        _insert_chunks(conn, User.__table__, (
+            {'id': i + 1, 'telegram_id': 1000000 + i, 'language': rng.choice(('ru', 'uz')),
+             'is_admin': False, 'is_first_usage': False}
+            for i in range(users)
+        ))
+
+        def order_rows():
+            for i in range(orders):
+                yield {'id': i + 1, 'user_id': rng.randint(1, users), 'total_amount': 0,
+                       'status': rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+                       'created_at': now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)),
+                       'name': f'User {i}', 'phone': '+998901234567', 'address': f'Street {i}'}
+        _insert_chunks(conn, Order.__table__, order_rows())
+
+        def item_rows():
+            for order_id in range(1, orders + 1):
+                for product_id in rng.sample(range(1, products + 1), rng.randint(1, min(3, products))):
+                    yield {'order_id': order_id, 'product_id': product_id,
+                           'quantity': rng.randint(1, 6), 'price': prices[product_id]}
+        _insert_chunks(conn, OrderItem.__table__, item_rows())
+
+        conn.execute(text(
+            'UPDATE orders SET total_amount = '
+            '(SELECT COALESCE(SUM(quantity * price), 0) FROM order_items WHERE order_items.order_id = orders.id)'
+        ))
+
+        _insert_chunks(conn, Cart.__table__, (
+            {'user_id': user_id, 'product_id': product_id, 'quantity': rng.randint(1, 10)}
+            for user_id in rng.sample(range(1, users + 1), cart_users)
+            for product_id in rng.sample(range(1, products + 1), rng.randint(1, min(3, products)))
+        ))
+
+        conn.execute(OrderStatusCount.__table__.delete())
+        conn.execute(insert(OrderStatusCount.__table__).from_select(
+            ['status', 'count'],
+            select(Order.status, func.count()).group_by(Order.status)
+        ))
+
+
+def percentile(sorted_values, p: float) -> float:
+    index = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+def measure(name, func, repeat: int, setup=None):
+    """Замер repeat вызовов func(arg); setup() готовит аргумент и в замер не входит"""
+    timings = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        func(arg)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    total = sum(timings)
+    result = {
+        'calls': repeat,
+        'mean_ms': round(statistics.mean(timings) * 1000, 4),
+        'p50_ms': round(percentile(timings, 50) * 1000, 4),
+        'p90_ms': round(percentile(timings, 90) * 1000, 4),
+        'p99_ms': round(percentile(timings, 99) * 1000, 4),
+        'max_ms': round(timings[-1] * 1000, 4),
+        'ops_per_s': round(repeat / total, 1) if total else None,
+    }
+    print(f"{name:<28} p50 {result['p50_ms']:>10.3f}ms  p99 {result['p99_ms']:>10.3f}ms  "
+          f"{result['ops_per_s'] or 0:>10.1f} ops/s")
+    return result
+
+
+def database_bytes(db_path: str) -> int:
+    """Размер базы: в режиме WAL свежие записи лежат в файле -wal,
+    поэтому сначала переносим их в основной файл"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+    # Если checkpoint не удался (база занята), учитываем и то, что осталось в -wal
+    wal_path = db_path + '-wal'
+    return os.path.getsize(db_path) + (os.path.getsize(wal_path) if os.path.exists(wal_path) else 0)
+
+
+def flask_client(db_url: str):
+    """Тестовый клиент app.py, переключенный на базу бенчмарка"""
+    import app as web_app
+    engine = create_db_engine(db_url)
+    web_app.engine = engine
+    web_app.Session.configure(bind=engine)
+    return web_app.app.test_client()
+
+
+def run(args, db_path: str):
+    users = max(int(args.users * args.scale), 10)
+    orders = max(int(args.orders * args.scale), 10)
+    cart_users = max(min(int(args.cart_users * args.scale), users), 1)
+    rng = random.Random(args.seed + 1)
+
+    db_url = f'sqlite:///{db_path}'
+    db = Database(url=db_url)
+
+    seed_seconds = None
+    with db.Session() as session:
+        existing_orders = session.query(func.count(Order.id)).scalar()
+    if existing_orders:
+        print(f"Using existing database {db_path} ({existing_orders} orders)")
+        with db.Session() as session:
+            users = session.query(func.count(User.id)).scalar()
+            orders = existing_orders
+            cart_users = session.query(func.count(func.distinct(Cart.user_id))).scalar()
+    else:
+        print(f"Seeding {db_path}: {users} users, {orders} orders, {cart_users} carts...")
+        start = time.perf_counter()
+        seed(db.engine, users, orders, cart_users, args.products, args.seed)
+        seed_seconds = round(time.perf_counter() - start, 2)
+        print(f"Seeded in {seed_seconds}s")
+
+    with db.Session() as session:
+        product_ids = [row[0] for row in session.query(Product.id)]
+        cart_telegram_ids = [row[0] for row in session.query(User.telegram_id)
+                             .join(Cart, Cart.user_id == User.id).distinct().limit(10000)]
+
+    random_telegram_id = lambda: 1000000 + rng.randrange(users)
+    random_product_id = lambda: rng.choice(product_ids)
+    repeat = args.repeat
+
+    results = {}
+    results['get_cart'] = measure(
+        'get_cart', lambda tid: db.get_cart(tid), repeat, lambda: rng.choice(cart_telegram_ids))
+    results['add_to_cart'] = measure(
+        'add_to_cart', lambda arg: db.add_to_cart(*arg), repeat,
+        lambda: (random_telegram_id(), random_product_id()))
+    results['adjust_cart_quantity'] = measure(
+        'adjust_cart_quantity', lambda arg: db.adjust_cart_quantity(*arg), repeat,
+        lambda: (random_telegram_id(), random_product_id(), 1))
+
+    def prepare_order():
+        telegram_id = random_telegram_id()
+        db.adjust_cart_quantity(telegram_id, random_product_id(), rng.randint(1, 6))
+        return {'user_id': telegram_id, 'name': 'Bench', 'phone': '+998901234567', 'address': 'Street'}
+    results['create_order'] = measure(
+        'create_order', lambda data: db.create_order(data), max(repeat // 4, 1), prepare_order)
+
+    results['get_user_orders'] = measure(
+        'get_user_orders', lambda tid: db.get_user_orders(tid), repeat, random_telegram_id)
+    results['get_orders_page'] = measure(
+        'get_orders_page', lambda _: db.get_orders_page(), max(repeat // 10, 1))
+    if args.all_orders_repeat > 0:
+        results['get_all_orders'] = measure(
+            'get_all_orders', lambda _: db.get_all_orders(), args.all_orders_repeat)
+
+    client = flask_client(db_url)
+
+    def api_get(url):
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+
+    results['api_orders_first_page'] = measure(
+        'api_orders_first_page', lambda _: api_get('/api/orders?per_page=20'), max(repeat // 4, 1))
+    results['api_orders_status_filter'] = measure(
+        'api_orders_status_filter', lambda _: api_get('/api/orders?per_page=20&status=new'), max(repeat // 4, 1))
+
+    # Глубокая страница: курсор на заказ из середины таблицы
+    with db.Session() as session:
+        middle = session.query(Order.id, Order.created_at).order_by(Order.created_at.desc(), Order.id.desc()) \
+            .offset(orders // 2).limit(1).first()
+    if middle:
+        cursor = f"{middle.created_at.isoformat()}_{middle.id}"
+        results['api_orders_deep_page'] = measure(
+            'api_orders_deep_page', lambda _: api_get(f'/api/orders?per_page=20&cursor={cursor}'),
+            max(repeat // 4, 1))
+
+    db.engine.dispose()
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'database': db_path,
+            'database_bytes': database_bytes(db_path),
+            'users': users,
+            'orders': orders,
+            'cart_users': cart_users,
+            'products': len(product_ids),
+            'repeat': repeat,
+            'seed_seconds': seed_seconds,
+        },
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--orders', type=int, default=1000000)
+    parser.add_argument('--cart-users', type=int, default=5000)
+    parser.add_argument('--products', type=int, default=10)
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель объемов (0.01 - быстрый прогон)')
+    parser.add_argument('--repeat', type=int, default=1000, help='вызовов на замер')
+    parser.add_argument('--all-orders-repeat', type=int, default=1, help='вызовов get_all_orders (0 - пропустить)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='SQLite-файл; если в нем уже есть данные, заполнение пропускается')
+    parser.add_argument('--output', default='db_bench.json', help='файл с результатами в JSON')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix='db_bench_') as tmp:
+        report = run(args, args.db or os.path.join(tmp, 'bench.db'))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
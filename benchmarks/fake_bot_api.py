@@ -0,0 +1,276 @@
+"""Локальная замена Telegram Bot API для сквозных нагрузочных тестов.
+
+Реализует getMe, getUpdates, sendMessage, sendPhoto, sendMediaGroup,
+editMessageCaption/Media/ReplyMarkup, answerCallbackQuery и setWebhook/deleteWebhook.
+Умеет добавлять задержку, отвечать 429 (случайно или при превышении лимита на чат)
+и записывает все вызовы.
+
+    python benchmarks/fake_bot_api.py --port 8081 --latency 50 --error-rate 0.01
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python bot.py
+
+Служебные адреса:
+    POST /_updates   - поставить обновление (или список) в очередь getUpdates
+    GET  /_recorded  - записанные вызовы
+    GET  /_stats     - число вызовов по методам и число ответов 429
+    POST /_reset     - очистить записи
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Поля, которые python-telegram-bot передает в форме как JSON
+JSON_FIELDS = {'reply_markup', 'media', 'allowed_updates', 'entities', 'caption_entities'}
+INT_FIELDS = {'chat_id', 'message_id', 'offset', 'limit', 'timeout'}
+
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0, jitter: float = 0, error_rate: float = 0,
+                 retry_after: int = 1, flood_limit: float = 0, record_file: str = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.flood_limit = flood_limit
+        self.record_file = record_file
+
+        self.recorded = []
+        self.calls = defaultdict(int)
+        self.rejected = 0
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._updates = []
+        self._updates_changed = asyncio.Condition()
+        self._chat_sends = defaultdict(deque)
+        self._runner = None
+
+        self.app = web.Application()
+        self.app.router.add_post('/_updates', self.handle_inject)
+        self.app.router.add_get('/_recorded', self.handle_recorded)
+        self.app.router.add_get('/_stats', self.handle_stats)
+        self.app.router.add_post('/_reset', self.handle_reset)
+        self.app.router.add_route('*', '/bot{token}/{method}', self.handle_method)
+
+    # --- разбор запросов ---
+
+    @staticmethod
+    def _decode(key, value):
+        if key in JSON_FIELDS and isinstance(value, str):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+        if key in INT_FIELDS and isinstance(value, str):
+            try:
+                return int(value)
+            except ValueError:
+                return value
+        return value
+
+    async def _params(self, request: web.Request):
+        params = dict(request.query)
+        if request.content_type == 'application/json':
+            params.update(await request.json())
+        elif request.can_read_body:
+            form = await request.post()
+            for key, value in form.items():
+                # Файлы (фото при загрузке) записываем только по имени
+                params[key] = getattr(value, 'filename', value)
+        return {key: self._decode(key, value) for key, value in params.items()}
+
+    # --- ответы ---
+
+    def _message(self, params, **fields):
+        chat_id = params.get('chat_id', 0)
+        message = {
+            'message_id': params.get('message_id') or next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if isinstance(chat_id, int) and chat_id > 0 else 'group'},
+        }
+        # Как и Telegram, в сообщении возвращаем только inline-клавиатуру
+        reply_markup = params.get('reply_markup')
+        if isinstance(reply_markup, dict) and 'inline_keyboard' in reply_markup:
+            message['reply_markup'] = reply_markup
+        message.update(fields)
+        return message
+
+    def _photo(self, file_id):
+        return [{'file_id': str(file_id), 'file_unique_id': str(file_id)[:32], 'width': 800, 'height': 600}]
+
+    async def _get_updates(self, params):
+        offset = params.get('offset') or 0
+        timeout = float(params.get('timeout') or 0)
+        limit = params.get('limit') or 100
+        deadline = time.monotonic() + timeout
+        async with self._updates_changed:
+            # Подтвержденные (update_id < offset) обновления больше не отдаем
+            self._updates = [u for u in self._updates if u['update_id'] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._updates_changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            return self._updates[:limit]
+
+    async def _result(self, token, method, params):
+        if method == 'getMe':
+            bot_id = int(token.split(':', 1)[0]) if token.split(':', 1)[0].isdigit() else 1
+            return {'id': bot_id, 'is_bot': True, 'first_name': 'Fake Bot', 'username': 'fake_bot',
+                    'can_join_groups': True, 'can_read_all_group_messages': False,
+                    'supports_inline_queries': False}
+        if method == 'getUpdates':
+            return await self._get_updates(params)
+        if method == 'sendMessage':
+            return self._message(params, text=params.get('text', ''))
+        if method == 'sendPhoto':
+            return self._message(params, photo=self._photo(params.get('photo')), caption=params.get('caption'))
+        if method == 'sendMediaGroup':
+            group_id = str(next(self._message_ids))
+            return [self._message(params, photo=self._photo(item.get('media')), caption=item.get('caption'),
+                                  media_group_id=group_id)
+                    for item in params.get('media') or []]
+        if method in ('editMessageCaption', 'editMessageMedia', 'editMessageReplyMarkup', 'editMessageText'):
+            if 'inline_message_id' in params:
+                return True
+            fields = {}
+            if method == 'editMessageCaption':
+                fields['caption'] = params.get('caption')
+            elif method == 'editMessageText':
+                fields['text'] = params.get('text', '')
+            elif method == 'editMessageMedia':
+                media = params.get('media') or {}
+                fields.update(photo=self._photo(media.get('media')), caption=media.get('caption'))
+            return self._message(params, **fields)
+        # answerCallbackQuery, setWebhook, deleteWebhook и прочие служебные вызовы
+        return True
+
+    def _flooded(self, chat_id) -> bool:
+        """Превышен ли лимит сообщений в чат за последнюю секунду"""
+        if not self.flood_limit or chat_id is None:
+            return False
+        now = time.monotonic()
+        sends = self._chat_sends[chat_id]
+        while sends and now - sends[0] > 1:
+            sends.popleft()
+        if len(sends) >= self.flood_limit:
+            return True
+        sends.append(now)
+        return False
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        token = request.match_info['token']
+        method = request.match_info['method']
+        params = await self._params(request)
+        self.calls[method] += 1
+        self._record(method, params)
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+
+        is_send = method.startswith(('send', 'edit', 'copy', 'forward'))
+        if is_send and (random.random() < self.error_rate or self._flooded(params.get('chat_id'))):
+            self.rejected += 1
+            return web.json_response({
+                'ok': False, 'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after}
+            }, status=429)
+
+        return web.json_response({'ok': True, 'result': await self._result(token, method, params)})
+
+    def _record(self, method, params):
+        if method == 'getUpdates':
+            return
+        entry = {'time': time.time(), 'method': method, 'params': params}
+        self.recorded.append(entry)
+        if self.record_file:
+            with open(self.record_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+
+    # --- служебные адреса ---
+
+    async def push_updates(self, updates):
+        async with self._updates_changed:
+            for update in updates:
+                update.setdefault('update_id', next(self._update_ids))
+                self._updates.append(update)
+            self._updates_changed.notify_all()
+
+    async def handle_inject(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        updates = data if isinstance(data, list) else [data]
+        await self.push_updates(updates)
+        return web.json_response({'ok': True, 'queued': len(updates)})
+
+    async def handle_recorded(self, request: web.Request) -> web.Response:
+        method = request.query.get('method')
+        recorded = [r for r in self.recorded if not method or r['method'] == method]
+        return web.json_response(recorded, dumps=lambda data: json.dumps(data, ensure_ascii=False, default=str))
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({'calls': dict(self.calls), 'rejected_429': self.rejected,
+                                  'pending_updates': len(self._updates)})
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.recorded.clear()
+        self.calls.clear()
+        self.rejected = 0
+        return web.json_response({'ok': True})
+
+    # --- запуск ---
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8081):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info("Fake Bot API listening on http://%s:%s", host, port)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0, help='задержка ответа, мс')
+    parser.add_argument('--jitter', type=float, default=0, help='разброс задержки, мс')
+    parser.add_argument('--error-rate', type=float, default=0, help='доля отправок, получающих 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after в ответе 429, с')
+    parser.add_argument('--flood-limit', type=float, default=0,
+                        help='сообщений в чат в секунду, после которых отвечаем 429 (0 - без лимита)')
+    parser.add_argument('--record', help='дописывать вызовы в JSONL-файл')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def serve():
+        api = FakeBotAPI(latency=args.latency / 1000, jitter=args.jitter / 1000, error_rate=args.error_rate,
+                         retry_after=args.retry_after, flood_limit=args.flood_limit, record_file=args.record)
+        await api.start(args.host, args.port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await api.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
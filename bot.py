@@ -1,11 +1,9 @@
 import asyncio
-import json
 import logging
-import os
 from datetime import datetime
 from typing import Dict, Any
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, InputMediaPhoto
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -16,10 +14,21 @@ from telegram.ext import (
     ConversationHandler
 )
 from telegram.error import TimedOut, NetworkError, TelegramError
+from telegram.request import BaseRequest
 
 from config import config
 from database import Database
+from http_client import create_bot_requests
+from localization import locales
+from metrics import start_http_server, timed_handler
+from pricing import pricing
+from async_database import AsyncDatabase
+from send_scheduler import Priority, SendScheduler, TelegramRateLimiter
+from update_processor import ChatOrderedUpdateProcessor
 from utils import setup_logging
+from webhook import WebhookServer
+
+logger = logging.getLogger(__name__)
 
 # Состояния разговора
 (
@@ -48,45 +57,28 @@ ADMIN_IDS = config.ADMIN_IDS
 
 
 class EcommerceBot:
-    def __init__(self):
+    def __init__(self, async_db: bool = None, db: Database = None):
         """Инициализация бота"""
         self.token = config.BOT_TOKEN
-        self.db = Database()
         
-        # Загрузка языковых файлов
-        self.locales = {}
-        self._load_locales()
+        # Все обработчики ожидают вызовы БД через await; при async_db=False
+        # запросы выполняются прямо в event loop, как раньше
+        if async_db is None:
+            async_db = config.DB_ASYNC
+        self.db = AsyncDatabase(db or Database(), max_workers=None if async_db else 0)
         
-        logging.info("Bot initialized successfully")
-
-    def _load_locales(self):
-        """Загрузка языковых файлов"""
-        try:
-            locales_dir = os.path.join(os.path.dirname(__file__), 'locales')
-            logging.info(f"Loading locales from: {locales_dir}")
-            
-            for filename in os.listdir(locales_dir):
-                if filename.endswith('.json'):
-                    language = filename.split('.')[0]
-                    file_path = os.path.join(locales_dir, filename)
-                    logging.info(f"Loading locale file: {file_path}")
-                    
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        self.locales[language] = json.load(f)
-                    logging.info(f"Successfully loaded locale: {language}")
-            
-            logging.info(f"Available locales: {list(self.locales.keys())}")
-        except Exception as e:
-            logging.error(f"Error loading locales: {str(e)}")
-            raise
+        # Все исходящие запросы к Telegram идут через общий планировщик лимитов
+        self.send_scheduler = SendScheduler()
+        
+        # Языковые таблицы и готовые клавиатуры (загружаются один раз)
+        self.locales = locales
+        self.pricing = pricing
+        
+        logger.info("Bot initialized successfully")
 
     def get_text(self, language: str, key: str) -> str:
         """Получение текста из языкового файла"""
-        try:
-            return self.locales[language][key]
-        except KeyError:
-            logging.error(f"Missing translation key: {key} for language: {language}")
-            return f"Missing translation: {key}"
+        return self.locales.get_text(language, key)
 # """
 #     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
 #         Начало разговора и выбор языка
@@ -117,19 +109,20 @@ class EcommerceBot:
 #         return SELECTING_LANGUAGE
 # """
 
+    @timed_handler
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начало разговора и выбор языка"""
         user_id = update.effective_user.id
         
         try:
             # Пытаемся получить пользователя из базы данных
-            user = self.db.get_user(user_id)
+            user = await self.db.get_user_identity(user_id)
             if user and user.language:
                 # Если у пользователя уже есть язык, используем его
                 context.user_data['language'] = user.language
                 return await self.show_main_menu(update, context)
         except Exception as e:
-            logging.error(f"Error getting user language: {str(e)}")
+            logger.error("Error getting user language: %s", e)
         
         # Получаем текст для приветствия в зависимости от языка
         language = context.user_data.get('language', 'uz')  # Если язык не выбран, по умолчанию будет 'en'
@@ -152,6 +145,7 @@ class EcommerceBot:
         )
         return SELECTING_LANGUAGE
 
+    @timed_handler
     async def select_language(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка выбора языка"""
         query = update.callback_query
@@ -165,10 +159,10 @@ class EcommerceBot:
         
         # Сохраняем язык в базе данных
         try:
-            self.db.set_language(user_id, language)
-            logging.info(f"User {user_id} selected language: {language}")
+            await self.db.set_language(user_id, language)
+            logger.info("User %s selected language: %s", user_id, language)
         except Exception as e:
-            logging.error(f"Error saving language preference: {str(e)}")
+            logger.error("Error saving language preference: %s", e)
             await query.message.reply_text(self.get_text(language, 'error_message'))
             return ConversationHandler.END
         
@@ -181,46 +175,32 @@ class EcommerceBot:
             language = context.user_data.get('language', 'ru')
             user_id = update.effective_user.id
             
-            logging.info(f"Showing main menu for user {user_id} with language {language}")
-            logging.info(f"Admin IDs: {config.ADMIN_IDS}")
-            logging.info(f"Is user admin? {user_id in config.ADMIN_IDS}")
-            
-            keyboard = [
-                [
-                    KeyboardButton(self.get_text(language, "products")),
-                    KeyboardButton(self.get_text(language, "cart"))
-                ],
-                [
-                    KeyboardButton(self.get_text(language, "orders")),
-                    KeyboardButton(self.get_text(language, "settings"))
-                ]
-            ]
-            
-            if user_id in config.ADMIN_IDS:
-                logging.info(f"Adding admin button for user {user_id}")
-                keyboard.append([KeyboardButton("👑 Админ-панель")])
+            logger.debug("Showing main menu for user %s with language %s", user_id, language)
+            logger.debug("Admin IDs: %s", config.ADMIN_IDS)
+            logger.debug("Is user admin? %s", user_id in config.ADMIN_IDS)
             
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+            reply_markup = self.locales.main_keyboard(language, user_id in config.ADMIN_IDS)
             text = self.get_text(language, "main_menu_text")
             
-            logging.info("Sending main menu message")
+            logger.debug("Sending main menu message")
             
             if update.callback_query:
                 await update.callback_query.message.reply_text(text, reply_markup=reply_markup)
             else:
                 await update.message.reply_text(text, reply_markup=reply_markup)
             
-            logging.info("Returning MAIN_MENU state")
+            logger.debug("Returning MAIN_MENU state")
             return MAIN_MENU
             
         except Exception as e:
-            logging.error(f"Error showing main menu: {str(e)}")
+            logger.error("Error showing main menu: %s", e)
             if update.callback_query:
                 await update.callback_query.message.reply_text("Произошла ошибка. Попробуйте /start")
             else:
                 await update.message.reply_text("Произошла ошибка. Попробуйте /start")
             return ConversationHandler.END
 
+    @timed_handler
     async def handle_menu_selection(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка выбора в главном меню"""
         try:
@@ -236,52 +216,14 @@ class EcommerceBot:
             
             user_id = update.effective_user.id
             
-            logging.info(f"handle_menu_selection called with text: '{text}', language: {language}, user_id: {user_id}")
+            logger.debug("handle_menu_selection called with text: '%s', language: %s, user_id: %s", text, language, user_id)
             
-            # Получаем текст из локализации и удаляем лишние пробелы
-            products_text = self.get_text(language, "products").strip()
-            cart_text = self.get_text(language, "cart").strip()
-            orders_text = self.get_text(language, "orders").strip()
-            settings_text = self.get_text(language, "settings").strip()
-            clear_cart_text = self.get_text(language, "clear_cart").strip()
-            back_to_menu_text = self.get_text(language, "back_to_menu").strip()
-            checkout_text = self.get_text(language, "checkout").strip()
-
-            logging.info(f"Comparing with: products='{products_text}', cart='{cart_text}', orders='{orders_text}', settings='{settings_text}'")
+            # Действие кнопки определяем одним поиском по обратному индексу
+            action = self.locales.action(language, text)
             
-            if text == products_text:
-                logging.info("Products button pressed")
-                products = self.db.get_products()
-                if not products:
-                    await message.reply_text(self.get_text(language, "no_products"))
-                else:
-                    for product in products:
-                        caption = f"{product['name_' + language]}\n"
-                        caption += f"{product['description_' + language]}\n"
-                        caption += f"{self.get_text(language, 'price')}: {product['price']} {self.get_text(language, 'currency')}"
-                        
-                        # Get current quantity from database
-                        cart_items = self.db.get_cart(user_id)
-                        current_quantity = 0
-                        for item in cart_items:
-                            if str(item['product_id']) == str(product['id']):
-                                current_quantity = item['quantity']
-                                break
-                        
-                        keyboard = [
-                            [
-                                InlineKeyboardButton("➖", callback_data=f"decrease_{product['id']}"),
-                                InlineKeyboardButton(f"{current_quantity}", callback_data="quantity"),
-                                InlineKeyboardButton("➕", callback_data=f"increase_{product['id']}")
-                            ]
-                        ]
-                        reply_markup = InlineKeyboardMarkup(keyboard)
-                        
-                        await message.reply_photo(
-                            photo=product['photo_id'],
-                            caption=caption,
-                            reply_markup=reply_markup
-                        )
+            if action == 'products':
+                logger.debug("Products button pressed")
+                await self.show_products(message, language, user_id)
                 return VIEWING_PRODUCTS
                 
             # elif text == cart_text:
@@ -306,72 +248,37 @@ class EcommerceBot:
             #         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
             #         await message.reply_text(cart_text, reply_markup=reply_markup)
             #     return CART
-            elif text == cart_text:
-                logging.info("Cart button pressed")
-                cart = self.db.get_cart(user_id)
-                user = self.db.get_user(user_id)
-                if not cart:
-                    await message.reply_text(self.get_text(language, "cart_empty"))
-                else:
-                    cart_text = f"{self.get_text(language, 'cart_header')}\n\n"
-                    bonus_text = ""
-                    total = 0
-                    for item in cart:
-                        subtotal = item['price'] * item['quantity']
-                        total += subtotal
-                        cart_text += f"{item['name']} x{item['quantity']} = {subtotal} {self.get_text(language, 'currency')}\n"
-                        if user.is_first_usage and item['is_promo']:
-                            bonus_text += f"{item['name']} x2 = 0 {self.get_text(language, 'currency')}\n"
-
-                        elif item['is_promo'] and item['quantity'] >= 5:
-                            quantity = item['quantity'] // 5
-                            bonus_text += f"{item['name']} x{quantity} = 0 {self.get_text(language, 'currency')}\n"
-                        
-                    
-                    if user.is_first_usage and bonus_text:
-                        cart_text += "\nBonus:\n"
-                        cart_text += bonus_text
-                    elif bonus_text:
-                        cart_text += "\nBonus:\n"
-                        cart_text += bonus_text
-
-                    cart_text += f"\n{self.get_text(language, 'total')}: {total} {self.get_text(language, 'currency')}"
-
-                    keyboard = [
-                        [KeyboardButton(self.get_text(language, "checkout"))],
-                        [KeyboardButton(self.get_text(language, "clear_cart"))],
-                        [KeyboardButton(self.get_text(language, "back_to_menu"))]
-                    ]
-                    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-                    await message.reply_text(cart_text, reply_markup=reply_markup)
+            elif action == 'cart':
+                logger.debug("Cart button pressed")
+                await self.reply_cart(message, user_id, language)
                 return CART
                 
-            elif text == clear_cart_text:
-                logging.info("Clear cart button pressed")
+            elif action == 'clear_cart':
+                logger.debug("Clear cart button pressed")
                 try:
-                    self.db.clear_cart(user_id)
+                    await self.db.clear_cart(user_id)
                     await message.reply_text(self.get_text(language, "cart_empty"))
                     return await self.show_main_menu(update, context)
                 except Exception as e:
-                    logging.error(f"Error clearing cart: {str(e)}")
+                    logger.error("Error clearing cart: %s", e)
                     await message.reply_text(self.get_text(language, "error_message"))
                 return CART
                 
-            elif text == back_to_menu_text:
-                logging.info("Back to menu button pressed")
+            elif action == 'back_to_menu':
+                logger.debug("Back to menu button pressed")
                 return await self.show_main_menu(update, context)
                 
-            elif text == checkout_text:
-                logging.info("Checkout button pressed")
-                cart = self.db.get_cart(user_id)
+            elif action == 'checkout':
+                logger.debug("Checkout button pressed")
+                cart = await self.db.get_cart_quantities(user_id)
                 if not cart:
                     await message.reply_text(self.get_text(language, "cart_empty"))
                     return CART
                 return await self.start_checkout(update, context)
                 
-            elif text == orders_text:
-                logging.info("Orders button pressed")
-                orders = self.db.get_user_orders(user_id)
+            elif action == 'orders':
+                logger.debug("Orders button pressed")
+                orders = await self.db.get_user_orders(user_id)
                 if not orders:
                     await message.reply_text(self.get_text(language, "no_orders"))
                 else:
@@ -387,8 +294,8 @@ class EcommerceBot:
                     await message.reply_text(orders_text)
                 return await self.show_main_menu(update, context)
                 
-            elif text == settings_text:
-                logging.info("Settings button pressed")
+            elif action == 'settings':
+                logger.debug("Settings button pressed")
                 keyboard = [
                     [
                         InlineKeyboardButton("🇷🇺 Русский", callback_data='ru'),
@@ -402,33 +309,153 @@ class EcommerceBot:
                 )
                 return SELECTING_LANGUAGE
                 
-            elif text == "👑 Админ-панель":
-                logging.info("Admin panel button pressed")
+            elif action == 'admin_panel':
+                logger.debug("Admin panel button pressed")
                 if user_id in config.ADMIN_IDS:
-                    keyboard = [
-                        [KeyboardButton("➕ Добавить товар")],
-                        [KeyboardButton("📝 Редактировать товар")],
-                        [KeyboardButton("📋 Просмотр заказов")],
-                        [KeyboardButton(self.get_text(language, "back_to_menu"))]
-                    ]
-                    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+                    reply_markup = self.locales.admin_keyboard(language)
                     await message.reply_text("Выберите действие:", reply_markup=reply_markup)
                     return ADMIN_MENU
                 else:
-                    logging.warning(f"Unauthorized access attempt to admin panel by user {user_id}")
+                    logger.warning("Unauthorized access attempt to admin panel by user %s", user_id)
                     await message.reply_text(self.get_text(language, "error_message"))
                     return await self.show_main_menu(update, context)
             
             # Если текст не совпадает ни с одним из известных действий
-            logging.warning(f"Unknown menu selection: {text}")
+            logger.warning("Unknown menu selection: %s", text)
             await message.reply_text(self.get_text(language, "error_message"))
             return await self.show_main_menu(update, context)
             
         except Exception as e:
-            logging.error(f"Error in handle_menu_selection: {str(e)}", exc_info=True)
+            logger.error("Error in handle_menu_selection: %s", e, exc_info=True)
             await message.reply_text(self.get_text(language, "error_message"))
             return await self.show_main_menu(update, context)
 
+    def _product_caption(self, language: str, product: Dict[str, Any]) -> str:
+        """Подпись к карточке товара"""
+        caption = f"{product['name_' + language]}\n"
+        caption += f"{product['description_' + language]}\n"
+        caption += f"{self.get_text(language, 'price')}: {product['price']} {self.get_text(language, 'currency')}"
+        return caption
+
+    def _quantity_row(self, product_id: int, quantity: int, label: str = None):
+        """Ряд кнопок ➖ / количество / ➕"""
+        return [
+            InlineKeyboardButton("➖", callback_data=f"decrease_{product_id}"),
+            InlineKeyboardButton(label or f"{quantity}", callback_data="quantity"),
+            InlineKeyboardButton("➕", callback_data=f"increase_{product_id}")
+        ]
+
+    def _page_row(self, index: int, pages: int):
+        """Ряд навигации ◀️ / номер страницы / ▶️"""
+        return [
+            InlineKeyboardButton("◀️", callback_data=f"products_page_{(index - 1) % pages}"),
+            InlineKeyboardButton(f"{index + 1}/{pages}", callback_data="quantity"),
+            InlineKeyboardButton("▶️", callback_data=f"products_page_{(index + 1) % pages}")
+        ]
+
+    async def _cart_quantities(self, user_id: int) -> Dict[int, int]:
+        """Количество каждого товара в корзине (в режиме CART_STORE=memory - без запросов к БД)"""
+        return await self.db.get_cart_quantities(user_id)
+
+    def _carousel_markup(self, products, index: int, quantities: Dict[int, int]):
+        """Клавиатура карточки карусели: количество и навигация"""
+        product = products[index]
+        keyboard = [self._quantity_row(product['id'], quantities.get(product['id'], 0))]
+        if len(products) > 1:
+            keyboard.append(self._page_row(index, len(products)))
+        return InlineKeyboardMarkup(keyboard)
+
+    def _media_group_markup(self, language: str, products, page: int, quantities: Dict[int, int]):
+        """Клавиатура под альбомом: по ряду на товар страницы и навигация"""
+        page_size = config.PRODUCTS_PAGE_SIZE
+        pages = (len(products) + page_size - 1) // page_size
+        keyboard = []
+        for product in products[page * page_size:(page + 1) * page_size]:
+            quantity = quantities.get(product['id'], 0)
+            label = f"{product['name_' + language]} × {quantity}"
+            keyboard.append(self._quantity_row(product['id'], quantity, label))
+        if pages > 1:
+            keyboard.append(self._page_row(page, pages))
+        return InlineKeyboardMarkup(keyboard)
+
+    async def show_products(self, message, language: str, user_id: int, index: int = 0):
+        """Показ каталога: одна карточка-карусель или альбом со страницей товаров"""
+        products = await self.db.get_products()
+        if not products:
+            await message.reply_text(self.get_text(language, "no_products"))
+            return
+
+        quantities = await self._cart_quantities(user_id)
+
+        if config.PRODUCTS_VIEW != 'media_group':
+            product = products[index]
+            await message.reply_photo(
+                photo=product['photo_id'],
+                caption=self._product_caption(language, product),
+                reply_markup=self._carousel_markup(products, index, quantities)
+            )
+            return
+
+        # Альбом из товаров страницы, под ним одно сообщение с кнопками
+        page_size = config.PRODUCTS_PAGE_SIZE
+        page_products = products[index * page_size:(index + 1) * page_size]
+        if len(page_products) > 1:
+            await message.reply_media_group(media=[
+                InputMediaPhoto(media=p['photo_id'], caption=self._product_caption(language, p))
+                for p in page_products
+            ])
+        else:
+            await message.reply_photo(
+                photo=page_products[0]['photo_id'],
+                caption=self._product_caption(language, page_products[0])
+            )
+        await message.reply_text(
+            self.get_text(language, "choose_product"),
+            reply_markup=self._media_group_markup(language, products, index, quantities)
+        )
+
+    @timed_handler
+    async def handle_products_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Листание каталога кнопками ◀️ / ▶️"""
+        query = update.callback_query
+        await query.answer()
+
+        language = context.user_data.get('language', 'ru')
+        user_id = update.effective_user.id
+
+        try:
+            index = int(query.data.rsplit('_', 1)[1])
+            products = await self.db.get_products()
+            if not products:
+                await query.message.reply_text(self.get_text(language, "no_products"))
+                return VIEWING_PRODUCTS
+
+            if config.PRODUCTS_VIEW == 'media_group':
+                # Альбом нельзя дешево отредактировать - отправляем следующую страницу
+                page_size = config.PRODUCTS_PAGE_SIZE
+                pages = (len(products) + page_size - 1) // page_size
+                await self.show_products(query.message, language, user_id, index % pages)
+                return VIEWING_PRODUCTS
+
+            # Карусель: редактируем ту же карточку одним запросом
+            index %= len(products)
+            product = products[index]
+            quantities = await self._cart_quantities(user_id)
+            await query.message.edit_media(
+                media=InputMediaPhoto(
+                    media=product['photo_id'],
+                    caption=self._product_caption(language, product)
+                ),
+                reply_markup=self._carousel_markup(products, index, quantities)
+            )
+
+        except Exception as e:
+            logger.error("Error in handle_products_page: %s", e, exc_info=True)
+            await query.message.reply_text(self.get_text(language, "error_message"))
+
+        return VIEWING_PRODUCTS
+
+    @timed_handler
     async def handle_product_button(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка кнопок товара (увеличение/уменьшение количества)"""
         query = update.callback_query
@@ -437,90 +464,60 @@ class EcommerceBot:
         language = context.user_data.get('language', 'ru')
         user_id = update.effective_user.id
         
-        logging.info(f"Processing product button. User: {user_id}, Data: {query.data}")
+        logger.debug("Processing product button. User: %s, Data: %s", user_id, query.data)
         
         try:
             # Безопасно разбираем callback_data
             if '_' not in query.data:
-                logging.error(f"Invalid callback data format: {query.data}")
+                logger.error("Invalid callback data format: %s", query.data)
                 await query.message.reply_text(self.get_text(language, "error_message"))
                 return VIEWING_PRODUCTS
                 
             action, product_id_str = query.data.split('_')
-            logging.info(f"Action: {action}, Product ID: {product_id_str}")
+            logger.debug("Action: %s, Product ID: %s", action, product_id_str)
             
             try:
                 product_id = int(product_id_str)
             except ValueError:
-                logging.error(f"Invalid product_id: {product_id_str}")
+                logger.error("Invalid product_id: %s", product_id_str)
                 await query.message.reply_text(self.get_text(language, "error_message"))
                 return VIEWING_PRODUCTS
             
             # Проверяем существование продукта
-            product = self.db.get_product(product_id)
+            product = await self.db.get_product(product_id)
             if not product:
-                logging.error(f"Product not found: {product_id}")
+                logger.error("Product not found: %s", product_id)
                 await query.message.reply_text(self.get_text(language, "error_message"))
                 return VIEWING_PRODUCTS
             
-            logging.info(f"Found product: {product}")
-            
-            # Получаем текущую корзину
-            cart_items = self.db.get_cart(user_id)
-            logging.info(f"Current cart items: {cart_items}")
-            
-            if action == 'increase':
-                # Всегда добавляем 1 к количеству
-                self.db.add_to_cart(user_id, product_id, 1)
-                logging.info(f"Added product {product_id} to cart for user {user_id}")
-            elif action == 'decrease':
-                # Находим товар в корзине
-                cart_item = None
-                for item in cart_items:
-                    if int(item['product_id']) == product_id:
-                        cart_item = item
-                        break
-                
-                logging.info(f"Found cart item: {cart_item}")
-                
-                # Если товар найден и его количество больше 0, уменьшаем на 1
-                if cart_item and cart_item['quantity'] > 0:
-                    new_quantity = cart_item['quantity'] - 1
-                    self.db.update_cart_item(user_id, cart_item['id'], new_quantity)
-                    logging.info(f"Decreased quantity to {new_quantity} for product {product_id}")
-            
-            # Получаем обновленное количество
-            cart_items = self.db.get_cart(user_id)
-            updated_quantity = 0
-            for item in cart_items:
-                if int(item['product_id']) == product_id:
-                    updated_quantity = item['quantity']
-                    break
-            
-            logging.info(f"Updated quantity: {updated_quantity}")
+            logger.debug("Found product: %s", product)
+
+            # Изменяем количество одной транзакцией и сразу получаем новое значение
+            delta = 1 if action == 'increase' else -1
+            updated_quantity = await self.db.adjust_cart_quantity(user_id, product_id, delta)
+
+            logger.debug("Updated quantity: %s", updated_quantity)
             
             # Обновляем сообщение с новым количеством
-            caption = f"{product['name_' + language]}\n"
-            caption += f"{product['description_' + language]}\n"
-            caption += f"{self.get_text(language, 'price')}: {product['price']} {self.get_text(language, 'currency')}"
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("➖", callback_data=f"decrease_{product_id}"),
-                    InlineKeyboardButton(f"{updated_quantity}", callback_data="quantity"),
-                    InlineKeyboardButton("➕", callback_data=f"increase_{product_id}")
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.message.edit_caption(
-                caption=caption,
-                reply_markup=reply_markup
-            )
-            logging.info("Successfully updated product message")
+            products = await self.db.get_products()
+            if config.PRODUCTS_VIEW == 'media_group':
+                quantities = await self._cart_quantities(user_id)
+                quantities[product_id] = updated_quantity
+                position = next(i for i, p in enumerate(products) if p['id'] == product_id)
+                page = position // config.PRODUCTS_PAGE_SIZE
+                await query.message.edit_reply_markup(
+                    reply_markup=self._media_group_markup(language, products, page, quantities)
+                )
+            else:
+                index = next(i for i, p in enumerate(products) if p['id'] == product_id)
+                await query.message.edit_caption(
+                    caption=self._product_caption(language, product),
+                    reply_markup=self._carousel_markup(products, index, {product_id: updated_quantity})
+                )
+            logger.debug("Successfully updated product message")
             
         except Exception as e:
-            logging.error(f"Error in handle_product_button: {str(e)}", exc_info=True)
+            logger.error("Error in handle_product_button: %s", e, exc_info=True)
             await query.message.reply_text(self.get_text(language, "error_message"))
         
         return VIEWING_PRODUCTS
@@ -532,25 +529,20 @@ class EcommerceBot:
             language = context.user_data.get('language', 'ru')
             
             if user_id not in config.ADMIN_IDS:
-                logging.warning(f"Unauthorized access attempt to admin menu by user {user_id}")
+                logger.warning("Unauthorized access attempt to admin menu by user %s", user_id)
                 await update.message.reply_text(self.get_text(language, "error_message"))
                 return await self.show_main_menu(update, context)
             
-            keyboard = [
-                [KeyboardButton("➕ Добавить товар")],
-                [KeyboardButton("📝 Редактировать товар")],
-                [KeyboardButton("📋 Просмотр заказов")],
-                [KeyboardButton(self.get_text(language, "back_to_menu"))]
-            ]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+            reply_markup = self.locales.admin_keyboard(language)
             await update.message.reply_text("Выберите действие:", reply_markup=reply_markup)
             return ADMIN_MENU
             
         except Exception as e:
-            logging.error(f"Error showing admin menu: {str(e)}", exc_info=True)
+            logger.error("Error showing admin menu: %s", e, exc_info=True)
             await update.message.reply_text(self.get_text(language, "error_message"))
             return await self.show_main_menu(update, context)
 
+    @timed_handler
     async def handle_add_product(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка добавления товара"""
         try:
@@ -558,13 +550,13 @@ class EcommerceBot:
             text = update.message.text.strip()
             language = context.user_data.get('language', 'ru')
             
-            logging.info(f"Adding product. User: {user_id}, Text: {text}")
+            logger.info("Adding product. User: %s, Text: %s", user_id, text)
 
             if text == "Назад":
                 return ADMIN_MENU
             
             if user_id not in config.ADMIN_IDS:
-                logging.warning(f"Unauthorized access attempt to add product by user {user_id}")
+                logger.warning("Unauthorized access attempt to add product by user %s", user_id)
                 await update.message.reply_text(self.get_text(language, "error_message"))
                 return await self.show_main_menu(update, context)
             
@@ -598,20 +590,21 @@ class EcommerceBot:
             return ADMIN_WAIT_PHOTO
             
         except Exception as e:
-            logging.error(f"Error in handle_add_product: {str(e)}", exc_info=True)
+            logger.error("Error in handle_add_product: %s", e, exc_info=True)
             await update.message.reply_text(self.get_text(language, "error_message"))
             return await self.show_main_menu(update, context)
             
+    @timed_handler
     async def handle_product_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка фотографии товара"""
         try:
             user_id = update.effective_user.id
             language = context.user_data.get('language', 'ru')
             
-            logging.info(f"Processing product photo. User: {user_id}")
+            logger.info("Processing product photo. User: %s", user_id)
             
             if user_id not in config.ADMIN_IDS:
-                logging.warning(f"Unauthorized access attempt to add product photo by user {user_id}")
+                logger.warning("Unauthorized access attempt to add product photo by user %s", user_id)
                 await update.message.reply_text(self.get_text(language, "error_message"))
                 return await self.show_main_menu(update, context)
             
@@ -627,7 +620,7 @@ class EcommerceBot:
             
             # Добавляем товар в базу данных
             try:
-                self.db.add_product(
+                await self.db.add_product(
                     name_ru=temp_product['name_ru'],
                     name_uz=temp_product['name_uz'],
                     description_ru=temp_product['description_ru'],
@@ -637,7 +630,7 @@ class EcommerceBot:
                 )
                 await update.message.reply_text("Товар успешно добавлен!")
             except Exception as e:
-                logging.error(f"Error adding product to database: {str(e)}")
+                logger.error("Error adding product to database: %s", e)
                 await update.message.reply_text("Ошибка при добавлении товара")
             
             # Очищаем временные данные
@@ -646,10 +639,32 @@ class EcommerceBot:
             return await self.show_admin_menu(update, context)
             
         except Exception as e:
-            logging.error(f"Error in handle_product_photo: {str(e)}", exc_info=True)
+            logger.error("Error in handle_product_photo: %s", e, exc_info=True)
             await update.message.reply_text(self.get_text(language, "error_message"))
             return await self.show_main_menu(update, context)
             
+    async def reply_cart(self, message, user_id: int, language: str):
+        """Показ корзины с бонусами и итогом (расчет - pricing.py)"""
+        cart = await self.db.get_cart(user_id)
+        if not cart:
+            await message.reply_text(self.get_text(language, "cart_empty"))
+            return
+
+        user = await self.db.get_user_identity(user_id)
+        quote = self.pricing.quote(cart, user.is_first_usage if user else True)
+        currency = self.get_text(language, 'currency')
+
+        cart_text = f"{self.get_text(language, 'cart_header')}\n\n"
+        for line in quote.lines:
+            cart_text += f"{line.name} x{line.quantity} = {line.subtotal} {currency}\n"
+        if quote.bonus_lines:
+            cart_text += "\nBonus:\n"
+            for line in quote.bonus_lines:
+                cart_text += f"{line.name} x{line.quantity} = 0 {currency}\n"
+        cart_text += f"\n{self.get_text(language, 'total')}: {quote.total} {currency}"
+
+        await message.reply_text(cart_text, reply_markup=self.locales.cart_keyboard(language))
+
     async def start_checkout(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Начало оформления заказа"""
         text = update.message.text
@@ -657,14 +672,13 @@ class EcommerceBot:
         user_id = update.effective_user.id
         
         # Проверяем корзину
-        cart = self.db.get_cart(user_id)
+        cart = await self.db.get_cart_quantities(user_id)
         if not cart:
             await update.message.reply_text(self.get_text(language, "cart_empty"))
             return CART
         
         # Кнопка "Назад в корзину"
-        keyboard = [[KeyboardButton(self.get_text(language, "back_to_cart"))]]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        reply_markup = self.locales.checkout_keyboard(language)
         
         await update.message.reply_text(
             self.get_text(language, "enter_name"),
@@ -672,42 +686,21 @@ class EcommerceBot:
         )
         return CHECKOUT_NAME
 
+    @timed_handler
     async def handle_checkout_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка имени пользователя"""
         text = update.message.text
         language = context.user_data.get('language', 'ru')
         
         if text == self.get_text(language, "back_to_cart"):
-            # Показываем корзину
-            cart_items = self.db.get_cart(update.effective_user.id)
-            if not cart_items:
-                await update.message.reply_text(self.get_text(language, "cart_empty"))
-            else:
-                # Показываем содержимое корзины
-                total = sum(item['price'] * item['quantity'] for item in cart_items)
-                cart_text = f"{self.get_text(language, 'cart_header')}:\n\n"
-                for item in cart_items:
-                    cart_text += f"{item['name']} x{item['quantity']} = {item['price'] * item['quantity']} {self.get_text(language, 'currency')}\n"
-                cart_text += f"\n{self.get_text(language, 'total')}: {total} {self.get_text(language, 'currency')}"
-                
-                keyboard = [
-                    [KeyboardButton(self.get_text(language, "checkout"))],
-                    [KeyboardButton(self.get_text(language, "clear_cart"))],
-                    [KeyboardButton(self.get_text(language, "back_to_menu"))]
-                ]
-                reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-                await update.message.reply_text(cart_text, reply_markup=reply_markup)
+            await self.reply_cart(update.message, update.effective_user.id, language)
             return CART
         
         # Сохраняем имя
         context.user_data['checkout_name'] = text
         
         # Кнопки для ввода телефона
-        keyboard = [
-            [KeyboardButton(self.get_text(language, "share_contact"), request_contact=True)],
-            [KeyboardButton(self.get_text(language, "back_to_cart"))]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        reply_markup = self.locales.checkout_keyboard(language, 'contact')
         
         await update.message.reply_text(
             self.get_text(language, "enter_phone"),
@@ -715,30 +708,13 @@ class EcommerceBot:
         )
         return CHECKOUT_PHONE
 
+    @timed_handler
     async def handle_checkout_phone(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка номера телефона"""
         language = context.user_data.get('language', 'ru')
         
         if update.message.text == self.get_text(language, "back_to_cart"):
-            # Показываем корзину
-            cart_items = self.db.get_cart(update.effective_user.id)
-            if not cart_items:
-                await update.message.reply_text(self.get_text(language, "cart_empty"))
-            else:
-                # Показываем содержимое корзины
-                total = sum(item['price'] * item['quantity'] for item in cart_items)
-                cart_text = f"{self.get_text(language, 'cart_header')}:\n\n"
-                for item in cart_items:
-                    cart_text += f"{item['name']} x{item['quantity']} = {item['price'] * item['quantity']} {self.get_text(language, 'currency')}\n"
-                cart_text += f"\n{self.get_text(language, 'total')}: {total} {self.get_text(language, 'currency')}"
-                
-                keyboard = [
-                    [KeyboardButton(self.get_text(language, "checkout"))],
-                    [KeyboardButton(self.get_text(language, "clear_cart"))],
-                    [KeyboardButton(self.get_text(language, "back_to_menu"))]
-                ]
-                reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-                await update.message.reply_text(cart_text, reply_markup=reply_markup)
+            await self.reply_cart(update.message, update.effective_user.id, language)
             return CART
         
         # Получаем телефон
@@ -751,11 +727,7 @@ class EcommerceBot:
         context.user_data['checkout_phone'] = phone
         
         # Кнопки для отправки локации
-        keyboard = [
-            [KeyboardButton(self.get_text(language, "share_location"), request_location=True)],
-            [KeyboardButton(self.get_text(language, "back_to_cart"))]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        reply_markup = self.locales.checkout_keyboard(language, 'location')
         
         await update.message.reply_text(
             self.get_text(language, "enter_address"),
@@ -763,6 +735,7 @@ class EcommerceBot:
         )
         return CHECKOUT_ADDRESS
 
+    @timed_handler
     async def handle_checkout_address(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка адреса доставки"""
         try:
@@ -770,31 +743,13 @@ class EcommerceBot:
             user_id = update.effective_user.id
             
             if update.message.text and update.message.text == self.get_text(language, "back_to_cart"):
-                # Показываем корзину
-                cart_items = self.db.get_cart(user_id)
-                if not cart_items:
-                    await update.message.reply_text(self.get_text(language, "cart_empty"))
-                else:
-                    # Показываем содержимое корзины
-                    total = sum(item['price'] * item['quantity'] for item in cart_items)
-                    cart_text = f"{self.get_text(language, 'cart_header')}:\n\n"
-                    for item in cart_items:
-                        cart_text += f"{item['name']} x{item['quantity']} = {item['price'] * item['quantity']} {self.get_text(language, 'currency')}\n"
-                    cart_text += f"\n{self.get_text(language, 'total')}: {total} {self.get_text(language, 'currency')}"
-                    
-                    keyboard = [
-                        [KeyboardButton(self.get_text(language, "checkout"))],
-                        [KeyboardButton(self.get_text(language, "clear_cart"))],
-                        [KeyboardButton(self.get_text(language, "back_to_menu"))]
-                    ]
-                    reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-                    await update.message.reply_text(cart_text, reply_markup=reply_markup)
+                await self.reply_cart(update.message, user_id, language)
                 return CART
             
             # Проверяем корзину
-            cart = self.db.get_cart(user_id)
+            cart = await self.db.get_cart_quantities(user_id)
             if not cart:
-                logging.warning(f"Empty cart for user {user_id}")
+                logger.warning("Empty cart for user %s", user_id)
                 await update.message.reply_text(self.get_text(language, "cart_empty"))
                 return CART
             
@@ -803,7 +758,7 @@ class EcommerceBot:
             phone = context.user_data.get('checkout_phone')
             
             if not name or not phone:
-                logging.error(f"Missing checkout data. Name: {name}, Phone: {phone}")
+                logger.error("Missing checkout data. Name: %s, Phone: %s", name, phone)
                 await update.message.reply_text(self.get_text(language, "error_message"))
                 return CART
             
@@ -826,36 +781,39 @@ class EcommerceBot:
             }
             
             try:
-                order_id = self.db.create_order(order_data)
-                logging.info(f"Order created successfully: {order_id}")
+                order_id = await self.db.create_order(order_data)
+                logger.info("Order created successfully: %s", order_id)
                 
                 # Очищаем данные оформления
                 context.user_data.pop('checkout_name', None)
                 context.user_data.pop('checkout_phone', None)
                 
-                await update.message.reply_text(
-                    self.get_text(language, "order_created").format(order_id=order_id)
+                await context.bot.send_message(
+                    chat_id=update.effective_chat.id,
+                    text=self.get_text(language, "order_created").format(order_id=order_id),
+                    rate_limit_args=Priority.CHECKOUT
                 )
                 return await self.show_main_menu(update, context)
                 
             except Exception as e:
-                logging.error(f"Error creating order: {str(e)}", exc_info=True)
+                logger.error("Error creating order: %s", e, exc_info=True)
                 await update.message.reply_text(self.get_text(language, "error_message"))
                 return CART
                 
         except Exception as e:
-            logging.error(f"Error in handle_checkout_address: {str(e)}", exc_info=True)
+            logger.error("Error in handle_checkout_address: %s", e, exc_info=True)
             await update.message.reply_text(self.get_text(language, "error_message"))
             return CART
 
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка ошибок"""
-        logging.error(f"Update {update} caused error {context.error}")
+        logger.error("Update %s caused error %s", update, context.error)
         if update and update.message:
             await update.message.reply_text(
                 "Произошла ошибка. Пожалуйста, попробуйте позже."
             )
 
+    @timed_handler
     async def handle_admin_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка админского меню"""
         try:
@@ -863,10 +821,10 @@ class EcommerceBot:
             text = update.message.text.strip()
             language = context.user_data.get('language', 'ru')
             
-            logging.info(f"Admin menu selection: {text}")
+            logger.info("Admin menu selection: %s", text)
             
             if user_id not in config.ADMIN_IDS:
-                logging.warning(f"Unauthorized access attempt to admin menu by user {user_id}")
+                logger.warning("Unauthorized access attempt to admin menu by user %s", user_id)
                 await update.message.reply_text(self.get_text(language, "error_message"))
                 return await self.show_main_menu(update, context)
             
@@ -883,7 +841,7 @@ class EcommerceBot:
                 
             elif text == "📝 Редактировать товар":
                 # Получаем список всех товаров
-                products = self.db.get_products()
+                products = await self.db.get_products()
                 if not products:
                     await update.message.reply_text("Товары не найдены")
                     return ADMIN_MENU
@@ -899,30 +857,42 @@ class EcommerceBot:
                 return EDIT_PRODUCT_SELECT
                 
             elif text == "📋 Просмотр заказов":
-                orders = self.db.get_all_orders()
-                if not orders:
+                # Идем по заказам постранично, не загружая всю таблицу в память
+                after_id = None
+                while True:
+                    orders = await self.db.get_orders_page(after_id)
+                    if not orders:
+                        break
+
+                    for order in orders:
+                        order_text = (
+                            f"Заказ #{order['id']}\n"
+                            f"Статус: {order['status']}\n"
+                            f"Клиент: {order['name']}\n"
+                            f"Телефон: {order['phone']}\n"
+                            f"Адрес: {order['address']}\n"
+                            f"Товары:\n"
+                        )
+
+                        total = 0
+                        for item in order['items']:
+                            price = item['price'] * item['quantity']
+                            total += price
+                            order_text += f"- {item['name']} x{item['quantity']} = {price} сум\n"
+
+                        order_text += f"\nИтого: {total} сум"
+                        # Массовый вывод уступает очередь ответам покупателям
+                        await context.bot.send_message(
+                            chat_id=update.effective_chat.id,
+                            text=order_text,
+                            rate_limit_args=Priority.BULK
+                        )
+
+                    after_id = orders[-1]['id']
+
+                if after_id is None:
                     await update.message.reply_text("Заказы не найдены")
-                    return ADMIN_MENU
-                
-                for order in orders:
-                    order_text = (
-                        f"Заказ #{order['id']}\n"
-                        f"Статус: {order['status']}\n"
-                        f"Клиент: {order['name']}\n"
-                        f"Телефон: {order['phone']}\n"
-                        f"Адрес: {order['address']}\n"
-                        f"Товары:\n"
-                    )
-                    
-                    total = 0
-                    for item in order['items']:
-                        price = item['price'] * item['quantity']
-                        total += price
-                        order_text += f"- {item['name']} x{item['quantity']} = {price} сум\n"
-                    
-                    order_text += f"\nИтого: {total} сум"
-                    await update.message.reply_text(order_text)
-                
+
                 return ADMIN_MENU
                 
             elif text == self.get_text(language, "back_to_menu"):
@@ -933,10 +903,11 @@ class EcommerceBot:
                 return ADMIN_MENU
                 
         except Exception as e:
-            logging.error(f"Error in handle_admin_menu: {str(e)}", exc_info=True)
+            logger.error("Error in handle_admin_menu: %s", e, exc_info=True)
             await update.message.reply_text(self.get_text(language, "error_message"))
             return await self.show_main_menu(update, context)
 
+    @timed_handler
     async def handle_edit_product_select(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка выбора товара для редактирования"""
         text = update.message.text
@@ -948,7 +919,7 @@ class EcommerceBot:
         product_name = text.replace("📝 ", "").split(" - ")[0]
         
         # Находим товар по названию
-        products = self.db.get_products()
+        products = await self.db.get_products()
         selected_product = None
         for product in products:
             if product['name_ru'] == product_name:
@@ -987,6 +958,7 @@ class EcommerceBot:
         await update.message.reply_text(product_info, reply_markup=reply_markup)
         return EDIT_PRODUCT_ACTION
 
+    @timed_handler
     async def handle_edit_product_action(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка действия редактирования товара"""
         text = update.message.text
@@ -1042,6 +1014,7 @@ class EcommerceBot:
         await update.message.reply_text("Неизвестная команда")
         return EDIT_PRODUCT_ACTION
 
+    @timed_handler
     async def handle_edit_product_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка ввода новых данных товара"""
         product_id = context.user_data.get('editing_product_id')
@@ -1058,7 +1031,7 @@ class EcommerceBot:
                     await update.message.reply_text("Ошибка: неверный формат. Нужно указать название на двух языках")
                     return EDIT_PRODUCT_INPUT
                 
-                self.db.update_product(product_id, name_ru=names[0], name_uz=names[1])
+                await self.db.update_product(product_id, name_ru=names[0], name_uz=names[1])
                 
             elif edit_action == 'description':
                 descriptions = update.message.text.strip().split('\n')
@@ -1066,12 +1039,12 @@ class EcommerceBot:
                     await update.message.reply_text("Ошибка: неверный формат. Нужно указать описание на двух языках")
                     return EDIT_PRODUCT_INPUT
                 
-                self.db.update_product(product_id, description_ru=descriptions[0], description_uz=descriptions[1])
+                await self.db.update_product(product_id, description_ru=descriptions[0], description_uz=descriptions[1])
                 
             elif edit_action == 'price':
                 try:
                     price = float(update.message.text.strip())
-                    self.db.update_product(product_id, price=price)
+                    await self.db.update_product(product_id, price=price)
                 except ValueError:
                     await update.message.reply_text("Ошибка: цена должна быть числом")
                     return EDIT_PRODUCT_INPUT
@@ -1082,16 +1055,17 @@ class EcommerceBot:
                     return EDIT_PRODUCT_INPUT
                 
                 photo_id = update.message.photo[-1].file_id
-                self.db.update_product(product_id, photo_id=photo_id)
+                await self.db.update_product(product_id, photo_id=photo_id)
             
             await update.message.reply_text("Товар успешно обновлен!")
             return await self.show_admin_menu(update, context)
             
         except Exception as e:
-            logging.error(f"Error updating product: {str(e)}", exc_info=True)
+            logger.error("Error updating product: %s", e, exc_info=True)
             await update.message.reply_text("Произошла ошибка при обновлении товара")
             return await self.show_admin_menu(update, context)
 
+    @timed_handler
     async def handle_edit_product_confirm_delete(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка подтверждения удаления товара"""
         text = update.message.text
@@ -1103,87 +1077,130 @@ class EcommerceBot:
         
         if text == "✅ Да, удалить":
             try:
-                self.db.delete_product(product_id)
+                await self.db.delete_product(product_id)
                 await update.message.reply_text("Товар успешно удален!")
             except Exception as e:
-                logging.error(f"Error deleting product: {str(e)}", exc_info=True)
+                logger.error("Error deleting product: %s", e, exc_info=True)
                 await update.message.reply_text("Произошла ошибка при удалении товара")
         
         return await self.show_admin_menu(update, context)
 
+    async def _post_init(self, application: Application):
+        """Запуск HTTP-сервера с метриками в event loop бота"""
+        self._metrics_runner = None
+        if config.METRICS_PORT:
+            self._metrics_runner = await start_http_server(config.METRICS_HOST, config.METRICS_PORT)
+
+    async def _post_shutdown(self, application: Application):
+        if self._metrics_runner is not None:
+            await self._metrics_runner.cleanup()
+            self._metrics_runner = None
+        # Запись корзин, которые еще не попали в БД (CART_STORE=memory)
+        await asyncio.to_thread(self.db.close)
+
+    def build_conversation_handler(self) -> ConversationHandler:
+        """Обработчик разговора со всеми состояниями бота"""
+        return ConversationHandler(
+            entry_points=[CommandHandler('start', self.start)],
+            states={
+                SELECTING_LANGUAGE: [
+                    CallbackQueryHandler(self.select_language, pattern='^(ru|uz)$')
+                ],
+                MAIN_MENU: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_menu_selection)
+                ],
+                VIEWING_PRODUCTS: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_menu_selection),
+                    CallbackQueryHandler(self.handle_product_button, pattern='^(increase|decrease)_[0-9]+$'),
+                    CallbackQueryHandler(self.handle_products_page, pattern='^products_page_[0-9]+$')
+                ],
+                CART: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_menu_selection)
+                ],
+                CHECKOUT_NAME: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_checkout_name)
+                ],
+                CHECKOUT_PHONE: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_checkout_phone),
+                    MessageHandler(filters.CONTACT, self.handle_checkout_phone)
+                ],
+                CHECKOUT_ADDRESS: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_checkout_address),
+                    MessageHandler(filters.LOCATION, self.handle_checkout_address)
+                ],
+                ADMIN_MENU: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_admin_menu)
+                ],
+                ADMIN_ADD_PRODUCT: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_add_product)
+                ],
+                ADMIN_EDIT_PRODUCT: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_admin_menu)
+                ],
+                ADMIN_VIEW_ORDERS: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_admin_menu)
+                ],
+                ADMIN_WAIT_PHOTO: [
+                    MessageHandler(filters.PHOTO, self.handle_product_photo)
+                ],
+                EDIT_PRODUCT_SELECT: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_edit_product_select)
+                ],
+                EDIT_PRODUCT_ACTION: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_edit_product_action)
+                ],
+                EDIT_PRODUCT_INPUT: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_edit_product_input)
+                ],
+                EDIT_PRODUCT_CONFIRM_DELETE: [
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_edit_product_confirm_delete)
+                ]
+            },
+            fallbacks=[CommandHandler('start', self.start)]
+        )
+
+    def build_application(self, request: BaseRequest = None, get_updates_request: BaseRequest = None) -> Application:
+        """Сборка Application с обработчиками.
+
+        request/get_updates_request можно подменить, например заглушкой
+        Bot API в нагрузочном тесте (benchmarks/load_test.py).
+        """
+        if request is None or get_updates_request is None:
+            default_request, default_get_updates_request = create_bot_requests()
+            request = request or default_request
+            get_updates_request = get_updates_request or default_get_updates_request
+
+        application = Application.builder() \
+            .token(self.token) \
+            .base_url(f"{config.TELEGRAM_API_URL}/bot") \
+            .base_file_url(f"{config.TELEGRAM_API_URL}/file/bot") \
+            .request(request) \
+            .get_updates_request(get_updates_request) \
+            .rate_limiter(TelegramRateLimiter(self.send_scheduler)) \
+            .concurrent_updates(ChatOrderedUpdateProcessor()) \
+            .post_init(self._post_init) \
+            .post_shutdown(self._post_shutdown) \
+            .build()
+
+        application.add_handler(self.build_conversation_handler())
+        application.add_error_handler(self.error_handler)
+        return application
+
     def run(self):
         """Запуск бота"""
         try:
-            application = Application.builder().token(self.token).build()
-
-            # Добавляем обработчик разговора
-            conv_handler = ConversationHandler(
-                entry_points=[CommandHandler('start', self.start)],
-                states={
-                    SELECTING_LANGUAGE: [
-                        CallbackQueryHandler(self.select_language, pattern='^(ru|uz)$')
-                    ],
-                    MAIN_MENU: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_menu_selection)
-                    ],
-                    VIEWING_PRODUCTS: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_menu_selection),
-                        CallbackQueryHandler(self.handle_product_button, pattern='^(increase|decrease)_[0-9]+$')
-                    ],
-                    CART: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_menu_selection)
-                    ],
-                    CHECKOUT_NAME: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_checkout_name)
-                    ],
-                    CHECKOUT_PHONE: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_checkout_phone),
-                        MessageHandler(filters.CONTACT, self.handle_checkout_phone)
-                    ],
-                    CHECKOUT_ADDRESS: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_checkout_address),
-                        MessageHandler(filters.LOCATION, self.handle_checkout_address)
-                    ],
-                    ADMIN_MENU: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_admin_menu)
-                    ],
-                    ADMIN_ADD_PRODUCT: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_add_product)
-                    ],
-                    ADMIN_EDIT_PRODUCT: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_admin_menu)
-                    ],
-                    ADMIN_VIEW_ORDERS: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_admin_menu)
-                    ],
-                    ADMIN_WAIT_PHOTO: [
-                        MessageHandler(filters.PHOTO, self.handle_product_photo)
-                    ],
-                    EDIT_PRODUCT_SELECT: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_edit_product_select)
-                    ],
-                    EDIT_PRODUCT_ACTION: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_edit_product_action)
-                    ],
-                    EDIT_PRODUCT_INPUT: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_edit_product_input)
-                    ],
-                    EDIT_PRODUCT_CONFIRM_DELETE: [
-                        MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_edit_product_confirm_delete)
-                    ]
-                },
-                fallbacks=[CommandHandler('start', self.start)]
-            )
-
-            application.add_handler(conv_handler)
-            application.add_error_handler(self.error_handler)
+            application = self.build_application()
 
             # Запускаем бота
-            logging.info("Starting bot...")
-            application.run_polling(allowed_updates=Update.ALL_TYPES)
+            if config.BOT_MODE == 'webhook':
+                logger.info("Starting bot in webhook mode...")
+                WebhookServer(application).run(allowed_updates=Update.ALL_TYPES)
+            else:
+                logger.info("Starting bot...")
+                application.run_polling(allowed_updates=Update.ALL_TYPES)
             
         except Exception as e:
-            logging.error(f"Error running bot: {str(e)}")
+            logger.error("Error running bot: %s", e)
             raise
 
 if __name__ == '__main__':
@@ -1194,5 +1211,5 @@ if __name__ == '__main__':
         bot = EcommerceBot()
         bot.run()
     except Exception as e:
-        logging.error(f"Fatal error: {str(e)}")
+        logger.error("Fatal error: %s", e)
         raise
@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from config import config
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class _Cart:
+    __slots__ = ('items', 'version', 'flushed_version', 'touched')
+
+    def __init__(self, items):
+        self.items = items
+        self.version = 0
+        self.flushed_version = 0
+        self.touched = time.monotonic()
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.flushed_version
+
+
+class MemoryCartStore:
+    """Корзины в памяти с отложенной записью в таблицу cart (write-behind).
+
+    Корзина пользователя - словарь product_id -> quantity. При промахе она
+    загружается через load(telegram_id), измененные корзины раз в
+    flush_interval секунд и при close() записываются через save({telegram_id: items}).
+    Вытесняются (LRU по max_size и по ttl простоя) только уже записанные корзины.
+    При аварийной остановке теряются изменения за последний интервал.
+    """
+
+    def __init__(self, load, save, max_size: int = None, ttl: float = None, flush_interval: float = None):
+        self._load = load
+        self._save = save
+        self.max_size = config.CART_STORE_SIZE if max_size is None else max_size
+        self.ttl = config.CART_STORE_TTL if ttl is None else ttl
+        self.flush_interval = config.CART_FLUSH_INTERVAL if flush_interval is None else flush_interval
+
+        self._lock = threading.Lock()
+        self._carts = OrderedDict()
+        # Запись выполняется одним потоком за раз (фоновым или close());
+        # снаружи блокировку берет Database.create_order
+        self.flush_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        registry.gauge('cart_store_carts', 'Carts held in the in-memory cart store').set_function(lambda: len(self._carts))
+        registry.gauge('cart_store_dirty_carts', 'Carts not yet written to the cart table') \
+            .set_function(lambda: sum(1 for cart in list(self._carts.values()) if cart.dirty))
+
+        self._thread = threading.Thread(target=self._run, name='cart-flush', daemon=True)
+        self._thread.start()
+
+    def _expired(self, cart: _Cart, now: float) -> bool:
+        return self.ttl > 0 and now - cart.touched > self.ttl
+
+    def _live(self, telegram_id: int, now: float):
+        """Корзина из памяти или None, если ее нужно загрузить (под self._lock)"""
+        cart = self._carts.get(telegram_id)
+        if cart is None:
+            return None
+        if not cart.dirty and self._expired(cart, now):
+            del self._carts[telegram_id]
+            return None
+        cart.touched = now
+        self._carts.move_to_end(telegram_id)
+        return cart
+
+    def _with_cart(self, telegram_id: int, func):
+        """Выполнить func(cart) под self._lock; при промахе корзина читается из БД без блокировки"""
+        now = time.monotonic()
+        with self._lock:
+            cart = self._live(telegram_id, now)
+            if cart is not None:
+                return func(cart)
+
+        items = self._load(telegram_id)
+        with self._lock:
+            cart = self._live(telegram_id, now)
+            if cart is None:
+                cart = self._carts[telegram_id] = _Cart(items)
+            result = func(cart)
+            self._evict()
+            return result
+
+    def _evict(self):
+        """LRU-вытеснение записанных корзин (под self._lock)"""
+        if len(self._carts) <= self.max_size:
+            return
+        for telegram_id in list(self._carts):
+            if len(self._carts) <= self.max_size:
+                break
+            if not self._carts[telegram_id].dirty:
+                del self._carts[telegram_id]
+
+    def get(self, telegram_id: int) -> dict:
+        """Копия корзины: product_id -> quantity"""
+        return self._with_cart(telegram_id, lambda cart: dict(cart.items))
+
+    def adjust(self, telegram_id: int, product_id: int, delta: int) -> int:
+        """Изменить количество на delta (не ниже нуля) и вернуть новое"""
+        def apply(cart):
+            quantity = max(cart.items.get(product_id, 0) + delta, 0)
+            self._set(cart, product_id, quantity)
+            return quantity
+        return self._with_cart(telegram_id, apply)
+
+    def set_quantity(self, telegram_id: int, product_id: int, quantity: int) -> bool:
+        """Задать количество товара, который уже есть в корзине"""
+        def apply(cart):
+            if product_id not in cart.items:
+                return False
+            self._set(cart, product_id, max(quantity, 0))
+            return True
+        return self._with_cart(telegram_id, apply)
+
+    def _set(self, cart: _Cart, product_id: int, quantity: int):
+        if quantity > 0:
+            cart.items[product_id] = quantity
+        else:
+            cart.items.pop(product_id, None)
+        cart.version += 1
+
+    def clear(self, telegram_id: int):
+        """Очистить корзину (строки в таблице удалятся при следующей записи)"""
+        with self._lock:
+            cart = self._carts.get(telegram_id)
+            if cart is None:
+                cart = self._carts[telegram_id] = _Cart({})
+            cart.items = {}
+            cart.version += 1
+            cart.touched = time.monotonic()
+
+    def flush(self) -> int:
+        """Записать измененные корзины одной транзакцией; возвращает их число"""
+        with self.flush_lock:
+            with self._lock:
+                snapshot = {telegram_id: (dict(cart.items), cart.version)
+                            for telegram_id, cart in self._carts.items() if cart.dirty}
+            if snapshot:
+                self._save({telegram_id: items for telegram_id, (items, _) in snapshot.items()})
+                with self._lock:
+                    for telegram_id, (_, version) in snapshot.items():
+                        cart = self._carts.get(telegram_id)
+                        # Изменения, сделанные во время записи, останутся грязными
+                        if cart is not None and cart.flushed_version < version:
+                            cart.flushed_version = version
+
+            now = time.monotonic()
+            with self._lock:
+                for telegram_id in [t for t, cart in self._carts.items() if not cart.dirty and self._expired(cart, now)]:
+                    del self._carts[telegram_id]
+                self._evict()
+            return len(snapshot)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                count = self.flush()
+                if count:
+                    logger.debug("Flushed %s carts", count)
+            except Exception as e:
+                logger.error("Cart flush failed: %s", e, exc_info=True)
+
+    def close(self):
+        """Остановка фоновой записи и запись оставшихся изменений"""
+        self._stop.set()
+        self._thread.join()
+        count = self.flush()
+        logger.info("Cart store closed, flushed %s carts", count)
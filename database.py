@@ -1,95 +1,272 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import insert, inspect, select, update, delete, case
+from sqlalchemy.orm import sessionmaker, selectinload
 from models import Base, User, Product, Order, Cart, OrderItem
+from cart_store import MemoryCartStore
 from config import Config
+from db_engine import create_db_engine, dialect_insert
+from metrics import instrument_engine
+from pricing import pricing
+from collections import OrderedDict, namedtuple
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Кэшируемые данные пользователя: внутренний id, язык и признак первой покупки
+UserIdentity = namedtuple('UserIdentity', ['id', 'language', 'is_first_usage'])
+# Позиция корзины с текущей ценой товара (create_order)
+CartLine = namedtuple('CartLine', ['product_id', 'quantity', 'price', 'is_promo'])
+
 class Database:
-    def __init__(self):
+    # Операции записи, которые WriteCoalescer может объединять в одну транзакцию.
+    # Тело каждой (_<name>) работает в переданной сессии и не делает commit
+    BATCHABLE_WRITES = ('set_language', 'add_to_cart', 'adjust_cart_quantity', 'clear_cart')
+
+    def __init__(self, url: str = None):
         self.config = Config()
-        self.engine = create_engine(self.config.DATABASE_URL)
+        self.engine = create_db_engine(url or self.config.DATABASE_URL)
+        instrument_engine(self.engine, 'bot')
         Base.metadata.create_all(self.engine)
+        self._check_schema()
         self.Session = sessionmaker(bind=self.engine)
+        self.dialect = self.engine.dialect.name
+
+        # Кэш каталога: товаров мало и меняются они только через админку
+        self._catalog_lock = threading.Lock()
+        self._catalog = None
+        self._catalog_loaded_at = 0
+        self.catalog_version = 0
+
+        # LRU-кэш telegram_id -> (UserIdentity, время загрузки), чтобы не искать
+        # пользователя в каждом запросе; записи старше USER_CACHE_TTL перечитываются
+        self._users_lock = threading.Lock()
+        self._users = OrderedDict()
+
+        # Корзины в памяти (CART_STORE=memory): чтение и изменение корзины
+        # без обращения к БД, таблица cart обновляется в фоне
+        self.carts = None
+        if self.config.CART_STORE == 'memory':
+            self.carts = MemoryCartStore(self._load_cart, self._save_carts)
+            # Операции с корзиной не трогают БД, объединять в транзакции нечего
+            self.BATCHABLE_WRITES = ('set_language',)
+
+    def _check_schema(self):
+        """Cart upserts (ON CONFLICT) need uq_cart_user_product, which
+        create_all does not add to a cart table created before migration 0001"""
+        inspector = inspect(self.engine)
+        names = {c['name'] for c in inspector.get_unique_constraints('cart')} | \
+            {i['name'] for i in inspector.get_indexes('cart') if i['unique']}
+        if 'uq_cart_user_product' not in names:
+            raise RuntimeError("Table cart has no uq_cart_user_product unique index: "
+                               "run 'alembic upgrade head' before starting")
+
+    def close(self):
+        """Write pending in-memory carts to the database"""
+        if self.carts is not None:
+            self.carts.close()
 
     def get_session(self):
         return self.Session()
 
-    def set_language(self, telegram_id: int, language: str):
-        """Set user language preference"""
+    def _after_commit(self, session, callback):
+        """Run callback once the session's transaction is committed"""
+        session.info.setdefault('after_commit', []).append(callback)
+
+    def _commit(self, session):
+        session.commit()
+        for callback in session.info.pop('after_commit', ()):
+            callback()
+
+    def _write(self, name: str, *args, **kwargs):
+        """Run write operation _<name> in its own transaction"""
         session = self.get_session()
         try:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if not user:
-                user = User(telegram_id=telegram_id, language=language)
-                session.add(user)
-            else:
-                user.language = language
-            session.commit()
-            logger.info(f"Language set for user {telegram_id}: {language}")
+            result = getattr(self, '_' + name)(session, *args, **kwargs)
+            self._commit(session)
+            return result
         except Exception as e:
-            logger.error(f"Error setting language for user {telegram_id}: {e}")
+            logger.error("Error in %s for user %s: %s", name, args[0] if args else None, e)
             session.rollback()
             raise
         finally:
             session.close()
 
+    def apply_writes(self, writes):
+        """Apply a batch of (name, args, kwargs) write operations in one transaction.
+
+        Returns one result per operation; a failed operation gets its exception
+        as the result. A failed operation is dropped and the rest of the batch is
+        replayed; if the commit itself fails, operations are applied one by one.
+        """
+        results = [None] * len(writes)
+        remaining = list(range(len(writes)))
+        while remaining:
+            session = self.get_session()
+            failed = None
+            try:
+                for index in remaining:
+                    name, args, kwargs = writes[index]
+                    try:
+                        results[index] = getattr(self, '_' + name)(session, *args, **kwargs)
+                    except Exception as e:
+                        logger.error("Error in %s for user %s: %s", name, args[0] if args else None, e)
+                        failed, results[index] = index, e
+                        raise
+                self._commit(session)
+                return results
+            except Exception as e:
+                session.rollback()
+                # Пользователи, созданные в откаченной транзакции, могли попасть в кэш
+                with self._users_lock:
+                    for index in remaining:
+                        args = writes[index][1]
+                        if args:
+                            self._users.pop(args[0], None)
+                if failed is None:
+                    logger.warning("Commit of %s batched writes failed, applying one by one: %s", len(remaining), e)
+                    break
+                remaining.remove(failed)
+            finally:
+                session.close()
+
+        for index in remaining:
+            name, args, kwargs = writes[index]
+            try:
+                results[index] = self._write(name, *args, **kwargs)
+            except Exception as e:
+                results[index] = e
+        return results
+
+    def _remember_user(self, telegram_id: int, user) -> UserIdentity:
+        """Put user into the identity cache"""
+        identity = UserIdentity(user.id, user.language, bool(user.is_first_usage))
+        with self._users_lock:
+            self._users[telegram_id] = (identity, time.monotonic())
+            self._users.move_to_end(telegram_id)
+            while len(self._users) > self.config.USER_CACHE_SIZE:
+                self._users.popitem(last=False)
+        return identity
+
+    def _update_cached_user(self, telegram_id: int, **changes):
+        """Update cached identity fields after a committed change"""
+        with self._users_lock:
+            entry = self._users.get(telegram_id)
+            if entry:
+                identity, loaded_at = entry
+                self._users[telegram_id] = (identity._replace(**changes), loaded_at)
+
+    def _resolve_user(self, session, telegram_id: int, create: bool = False, **fields):
+        """Get UserIdentity by telegram ID using the cache, optionally creating the user"""
+        with self._users_lock:
+            entry = self._users.get(telegram_id)
+            if entry:
+                identity, loaded_at = entry
+                if time.monotonic() - loaded_at <= self.config.USER_CACHE_TTL:
+                    self._users.move_to_end(telegram_id)
+                    return identity
+                del self._users[telegram_id]
+
+        user = session.query(User).filter_by(telegram_id=telegram_id).first()
+        if user:
+            return self._remember_user(telegram_id, user)
+        if not create:
+            return None
+
+        # Нового пользователя кэшируем только после коммита, при следующем обращении
+        user = User(telegram_id=telegram_id, is_first_usage=True, **fields)
+        session.add(user)
+        session.flush()
+        return UserIdentity(user.id, user.language, True)
+
+    def get_user_identity(self, telegram_id: int):
+        """Get cached user id, language and promo state by telegram ID"""
+        session = self.get_session()
+        try:
+            return self._resolve_user(session, telegram_id)
+        except Exception as e:
+            logger.error("Error getting user %s: %s", telegram_id, e)
+            raise
+        finally:
+            session.close()
+
+    def _product_to_dict(self, product):
+        return {
+            'id': product.id,
+            'name_ru': product.name_ru,
+            'name_uz': product.name_uz,
+            'description_ru': product.description_ru,
+            'description_uz': product.description_uz,
+            'price': product.price,
+            'photo_id': product.photo_id,
+            'is_promo': product.is_promo
+        }
+
+    def _get_catalog(self):
+        """Get cached catalog, loading it from the database if needed"""
+        ttl = self.config.CATALOG_CACHE_TTL
+        with self._catalog_lock:
+            expired = ttl > 0 and time.monotonic() - self._catalog_loaded_at > ttl
+            if self._catalog is None or expired:
+                session = self.get_session()
+                try:
+                    products = session.query(Product).order_by(Product.id).all()
+                    self._catalog = {p.id: self._product_to_dict(p) for p in products}
+                    self._catalog_loaded_at = time.monotonic()
+                    self.catalog_version += 1
+                    logger.info("Catalog loaded: %s products, version %s", len(self._catalog), self.catalog_version)
+                finally:
+                    session.close()
+            return self._catalog
+
+    def invalidate_catalog(self):
+        """Drop cached catalog so the next read reloads it"""
+        with self._catalog_lock:
+            self._catalog = None
+
+    def set_language(self, telegram_id: int, language: str):
+        """Set user language preference"""
+        return self._write('set_language', telegram_id, language)
+
+    def _set_language(self, session, telegram_id: int, language: str):
+        # Создание или обновление одним запросом
+        stmt = dialect_insert(self.dialect, User).values(
+            telegram_id=telegram_id,
+            language=language
+        ).on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={'language': language}
+        )
+        session.execute(stmt)
+        self._after_commit(session, lambda: self._update_cached_user(telegram_id, language=language))
+        logger.info("Language set for user %s: %s", telegram_id, language)
+
     def get_user(self, telegram_id: int):
         """Get user by telegram ID"""
         session = self.get_session()
         try:
             return session.query(User).filter_by(telegram_id=telegram_id).first()
         except Exception as e:
-            logger.error(f"Error getting user {telegram_id}: {e}")
+            logger.error("Error getting user %s: %s", telegram_id, e)
             raise
         finally:
             session.close()
 
     def get_products(self):
-        """Get all products"""
-        session = self.get_session()
+        """Get all products (cached dicts, must not be modified)"""
         try:
-            products = session.query(Product).all()
-            return [
-                {
-                    'id': p.id,
-                    'name_ru': p.name_ru,
-                    'name_uz': p.name_uz,
-                    'description_ru': p.description_ru,
-                    'description_uz': p.description_uz,
-                    'price': p.price,
-                    'photo_id': p.photo_id
-                }
-                for p in products
-            ]
+            return list(self._get_catalog().values())
         except Exception as e:
-            logger.error(f"Error getting products: {e}")
+            logger.error("Error getting products: %s", e)
             raise
-        finally:
-            session.close()
 
     def get_product(self, product_id: int):
-        """Get product by ID"""
-        session = self.get_session()
+        """Get product by ID (cached dict, must not be modified)"""
         try:
-            product = session.query(Product).filter_by(id=product_id).first()
-            if product:
-                return {
-                    'id': product.id,
-                    'name_ru': product.name_ru,
-                    'name_uz': product.name_uz,
-                    'description_ru': product.description_ru,
-                    'description_uz': product.description_uz,
-                    'price': product.price,
-                    'photo_id': product.photo_id
-                }
-            return None
+            return self._get_catalog().get(product_id)
         except Exception as e:
-            logger.error(f"Error getting product {product_id}: {e}")
+            logger.error("Error getting product %s: %s", product_id, e)
             raise
-        finally:
-            session.close()
 
     def add_product(self, name_ru, name_uz, description_ru, description_uz, price, photo_id):
         """Add a new product"""
@@ -105,10 +282,11 @@ class Database:
             )
             session.add(product)
             session.commit()
-            logger.info(f"Added new product: {name_ru}")
+            self.invalidate_catalog()
+            logger.info("Added new product: %s", name_ru)
             return product.id
         except Exception as e:
-            logger.error(f"Error adding product: {e}")
+            logger.error("Error adding product: %s", e)
             session.rollback()
             raise
         finally:
@@ -123,11 +301,12 @@ class Database:
                 for key, value in kwargs.items():
                     setattr(product, key, value)
                 session.commit()
-                logger.info(f"Updated product {product_id}")
+                self.invalidate_catalog()
+                logger.info("Updated product %s", product_id)
                 return True
             return False
         except Exception as e:
-            logger.error(f"Error updating product {product_id}: {e}")
+            logger.error("Error updating product %s: %s", product_id, e)
             session.rollback()
             raise
         finally:
@@ -141,21 +320,101 @@ class Database:
             if product:
                 session.delete(product)
                 session.commit()
-                logger.info(f"Deleted product {product_id}")
+                self.invalidate_catalog()
+                logger.info("Deleted product %s", product_id)
                 return True
             return False
         except Exception as e:
-            logger.error(f"Error deleting product {product_id}: {e}")
+            logger.error("Error deleting product %s: %s", product_id, e)
             session.rollback()
             raise
         finally:
             session.close()
 
+    def _load_cart(self, telegram_id: int) -> dict:
+        """Load cart from the cart table into the memory store"""
+        session = self.get_session()
+        try:
+            user = self._resolve_user(session, telegram_id)
+            if not user:
+                return {}
+            rows = session.query(Cart.product_id, Cart.quantity) \
+                .filter(Cart.user_id == user.id).order_by(Cart.id)
+            return {row.product_id: row.quantity for row in rows}
+        finally:
+            session.close()
+
+    def _save_carts(self, carts: dict):
+        """Replace cart rows of the given users in one transaction: {telegram_id: {product_id: quantity}}"""
+        session = self.get_session()
+        try:
+            # Удаленные товары не записываем; кэш каталога может о них еще не знать
+            product_ids = {product_id for items in carts.values() for product_id in items}
+            existing = set(session.scalars(select(Product.id).where(Product.id.in_(product_ids)))) \
+                if product_ids else set()
+            for telegram_id, items in carts.items():
+                user = self._resolve_user(session, telegram_id, create=bool(items))
+                if not user:
+                    continue
+                session.execute(delete(Cart).where(Cart.user_id == user.id))
+                rows = [{'user_id': user.id, 'product_id': product_id, 'quantity': quantity}
+                        for product_id, quantity in items.items() if product_id in existing]
+                if rows:
+                    session.execute(insert(Cart), rows)
+            session.commit()
+        except Exception as e:
+            logger.error("Error saving %s carts: %s", len(carts), e)
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def get_cart_quantities(self, telegram_id: int) -> dict:
+        """Get product_id -> quantity of user's cart (no product data)"""
+        if self.carts is not None:
+            # Карусель и кнопки ➕/➖ не обращаются к БД
+            return self.carts.get(telegram_id)
+
+        session = self.get_session()
+        try:
+            user = self._resolve_user(session, telegram_id)
+            if not user:
+                return {}
+            rows = session.query(Cart.product_id, Cart.quantity).filter(Cart.user_id == user.id)
+            return {row.product_id: row.quantity for row in rows}
+        except Exception as e:
+            logger.error("Error getting cart quantities for user %s: %s", telegram_id, e)
+            raise
+        finally:
+            session.close()
+
     def get_cart(self, telegram_id: int):
         """Get user's cart"""
         session = self.get_session()
         try:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
+            if self.carts is not None:
+                # Количества из памяти, а цены - из БД, как в create_order: кэш каталога
+                # не видит правок из админки, и показанная сумма разошлась бы с оплатой.
+                # id позиции - id товара
+                cart = self.carts.get(telegram_id)
+                if not cart:
+                    return []
+                products = session.query(Product.id, Product.name_ru, Product.price, Product.is_promo) \
+                    .filter(Product.id.in_(list(cart))).all()
+                products = {product.id: product for product in products}
+                return [
+                    {
+                        'id': product_id,
+                        'product_id': product_id,
+                        'name': products[product_id].name_ru,
+                        'price': products[product_id].price,
+                        'quantity': quantity,
+                        'is_promo': products[product_id].is_promo
+                    }
+                    for product_id, quantity in cart.items() if product_id in products
+                ]
+
+            user = self._resolve_user(session, telegram_id)
             if not user:
                 return []
 
@@ -173,62 +432,95 @@ class Database:
                 for item in cart_items
             ]
         except Exception as e:
-            logger.error(f"Error getting cart for user {telegram_id}: {e}")
+            logger.error("Error getting cart for user %s: %s", telegram_id, e)
             raise
         finally:
             session.close()
 
     def add_to_cart(self, telegram_id: int, product_id: int, quantity: int = 1):
         """Add product to cart"""
-        session = self.get_session()
-        try:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if not user:
-                user = User(telegram_id=telegram_id)
-                session.add(user)
-                session.flush()
-            
-            cart_item = session.query(Cart).filter_by(
+        if self.carts is not None:
+            self.carts.adjust(telegram_id, product_id, quantity)
+            return
+        return self._write('add_to_cart', telegram_id, product_id, quantity)
+
+    def _add_to_cart(self, session, telegram_id: int, product_id: int, quantity: int = 1):
+        user = self._resolve_user(session, telegram_id, create=True)
+
+        # Вставка или увеличение количества одним запросом (uq_cart_user_product)
+        stmt = dialect_insert(self.dialect, Cart).values(
+            user_id=user.id,
+            product_id=product_id,
+            quantity=quantity
+        ).on_conflict_do_update(
+            index_elements=[Cart.user_id, Cart.product_id],
+            set_={'quantity': Cart.quantity + quantity}
+        )
+        session.execute(stmt)
+        logger.debug("Added product %s to cart for user %s", product_id, telegram_id)
+
+    def adjust_cart_quantity(self, telegram_id: int, product_id: int, delta: int) -> int:
+        """Change cart quantity by delta in one transaction and return the new quantity"""
+        if self.carts is not None:
+            return self.carts.adjust(telegram_id, product_id, delta)
+        return self._write('adjust_cart_quantity', telegram_id, product_id, delta)
+
+    def _adjust_cart_quantity(self, session, telegram_id: int, product_id: int, delta: int) -> int:
+        user = self._resolve_user(session, telegram_id, create=delta > 0)
+        if not user:
+            return 0
+
+        # Количество не может уйти ниже нуля
+        new_quantity = case(
+            (Cart.quantity + delta > 0, Cart.quantity + delta),
+            else_=0
+        )
+        if delta > 0:
+            stmt = dialect_insert(self.dialect, Cart).values(
                 user_id=user.id,
-                product_id=product_id
-            ).first()
-            
-            if cart_item:
-                cart_item.quantity += quantity
-            else:
-                cart_item = Cart(user_id=user.id, product_id=product_id, quantity=quantity)
-                session.add(cart_item)
-            
-            session.commit()
-            logger.info(f"Added product {product_id} to cart for user {telegram_id}")
-        except Exception as e:
-            logger.error(f"Error adding to cart for user {telegram_id}: {e}")
-            session.rollback()
-            raise
-        finally:
-            session.close()
+                product_id=product_id,
+                quantity=delta
+            ).on_conflict_do_update(
+                index_elements=[Cart.user_id, Cart.product_id],
+                set_={'quantity': new_quantity}
+            )
+        else:
+            stmt = update(Cart).where(
+                Cart.user_id == user.id,
+                Cart.product_id == product_id
+            ).values(quantity=new_quantity)
+
+        quantity = session.execute(stmt.returning(Cart.quantity)).scalar() or 0
+        if quantity == 0:
+            session.execute(delete(Cart).where(
+                Cart.user_id == user.id,
+                Cart.product_id == product_id
+            ))
+        logger.debug("Cart quantity of product %s for user %s is now %s", product_id, telegram_id, quantity)
+        return quantity
 
     def clear_cart(self, telegram_id: int):
         """Clear user's cart"""
-        session = self.get_session()
-        try:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if user:
-                session.query(Cart).filter_by(user_id=user.id).delete()
-                session.commit()
-                logger.info(f"Cleared cart for user {telegram_id}")
-        except Exception as e:
-            logger.error(f"Error clearing cart for user {telegram_id}: {e}")
-            session.rollback()
-            raise
-        finally:
-            session.close()
+        if self.carts is not None:
+            self.carts.clear(telegram_id)
+            return
+        return self._write('clear_cart', telegram_id)
+
+    def _clear_cart(self, session, telegram_id: int):
+        user = self._resolve_user(session, telegram_id)
+        if user:
+            session.query(Cart).filter_by(user_id=user.id).delete()
+            logger.info("Cleared cart for user %s", telegram_id)
 
     def update_cart_item(self, telegram_id: int, cart_item_id: int, quantity: int):
         """Update cart item quantity"""
+        if self.carts is not None:
+            # В памяти id позиции совпадает с id товара (см. get_cart)
+            self.carts.set_quantity(telegram_id, cart_item_id, quantity)
+            return
         session = self.get_session()
         try:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
+            user = self._resolve_user(session, telegram_id)
             if user:
                 cart_item = session.query(Cart).filter_by(id=cart_item_id, user_id=user.id).first()
                 if cart_item:
@@ -237,9 +529,9 @@ class Database:
                     else:
                         session.delete(cart_item)
                     session.commit()
-                    logger.info(f"Updated cart item {cart_item_id} for user {telegram_id}")
+                    logger.info("Updated cart item %s for user %s", cart_item_id, telegram_id)
         except Exception as e:
-            logger.error(f"Error updating cart item for user {telegram_id}: {e}")
+            logger.error("Error updating cart item for user %s: %s", telegram_id, e)
             session.rollback()
             raise
         finally:
@@ -247,24 +539,63 @@ class Database:
 
     def create_order(self, order_data: dict):
         """Create new order"""
+        if self.carts is None:
+            return self._place_order(order_data)
+        # Фоновая запись корзин ждет окончания заказа: иначе снимок корзины,
+        # сделанный до заказа, мог бы вернуть в таблицу cart удаленные строки
+        with self.carts.flush_lock:
+            return self._place_order(order_data)
+
+    def _place_order(self, order_data: dict):
+        # Снимок корзины из памяти; изменения одного пользователя бот обрабатывает
+        # по очереди (ChatOrderedUpdateProcessor), поэтому до очистки он не изменится
+        cart = self.carts.get(order_data['user_id']) if self.carts is not None else None
         session = self.get_session()
         try:
             # Получаем или создаем пользователя
-            user = session.query(User).filter_by(telegram_id=order_data['user_id']).first()
-            if not user:
-                user = User(
-                    telegram_id=order_data['user_id'],
-                    name=order_data['name'],
-                    phone=order_data['phone'],
-                    address=order_data['address']
-                )
-                session.add(user)
-                session.flush()
+            user = self._resolve_user(
+                session,
+                order_data['user_id'],
+                create=True,
+                name=order_data['name'],
+                phone=order_data['phone'],
+                address=order_data['address']
+            )
+            # Бонус первой покупки - по текущему значению в БД, а не по кэшу:
+            # флаг могли изменить в админке
+            is_first_usage = bool(session.scalar(select(User.is_first_usage).where(User.id == user.id)))
+
+            if cart is not None:
+                # Количества из памяти, цены - из БД на момент заказа
+                products = session.query(Product.id, Product.price, Product.is_promo) \
+                    .filter(Product.id.in_(list(cart))).all()
+                prices = {product.id: product for product in products}
+                cart_items = [
+                    CartLine(product_id, quantity, prices[product_id].price, prices[product_id].is_promo)
+                    for product_id, quantity in cart.items() if product_id in prices
+                ]
+            else:
+                # Корзина вместе с ценами товаров одним запросом
+                cart_items = session.query(
+                    Cart.product_id,
+                    Cart.quantity,
+                    Product.price,
+                    Product.is_promo
+                ).join(Product, Product.id == Cart.product_id).filter(Cart.user_id == user.id).all()
+
+            # Сумма и бонусы считает тот же движок, что и корзину в боте
+            quote = pricing.quote([item._asdict() for item in cart_items], is_first_usage)
+            total_amount = quote.total
+            # Позиции по текущей цене и бонусные позиции с нулевой ценой
+            order_items = [
+                {'product_id': line.product_id, 'quantity': line.quantity, 'price': line.price}
+                for line in quote.lines + quote.bonus_lines
+            ]
 
             # Создаем заказ
             order = Order(
                 user_id=user.id,
-                total_amount=0,  # Обновим позже
+                total_amount=total_amount,
                 status='new',
                 name=order_data['name'],
                 phone=order_data['phone'],
@@ -273,57 +604,27 @@ class Database:
             session.add(order)
             session.flush()  # Чтобы получить order.id
 
-            # Добавляем товары в заказ
-            total_amount = 0
-            cart = session.query(Cart).filter_by(user_id=user.id).all()
-
-            for cart_item in cart:
-                product = session.query(Product).filter_by(id=cart_item.product_id).first()
-                if product:
-                    # Создаем элемент заказа
-                    order_item = OrderItem(
-                        order_id=order.id,
-                        product_id=product.id,
-                        quantity=cart_item.quantity,
-                        price=product.price  # Сохраняем текущую цену
-                    )
-                    session.add(order_item)
-                    total_amount += product.price * cart_item.quantity
-
-                    if product.is_promo and user.is_first_usage:
-                        order_item = OrderItem(
-                            order_id=order.id,
-                            product_id=product.id,
-                            quantity=2,
-                            price=0
-                        )
-                        session.add(order_item)
-                    elif product.is_promo and cart_item.quantity >= 5:
-                        quantity = cart_item.quantity // 5
-                        order_item = OrderItem(
-                            order_id=order.id,
-                            product_id=product.id,
-                            quantity=quantity,
-                            price=0
-                        )
-                        session.add(order_item)
-                        
-
-
-            # Обновляем общую сумму заказа
-            order.total_amount = total_amount
-            user.is_first_usage = False
+            # Добавляем товары в заказ одной пакетной вставкой
+            if order_items:
+                for order_item in order_items:
+                    order_item['order_id'] = order.id
+                session.execute(insert(OrderItem), order_items)
 
+            if is_first_usage:
+                session.execute(update(User).where(User.id == user.id).values(is_first_usage=False))
 
             # Очищаем корзину
             session.query(Cart).filter_by(user_id=user.id).delete()
 
             session.commit()
-            logger.info(f"Order created: #{order.id} for user {order_data['user_id']}")
+            if self.carts is not None:
+                self.carts.clear(order_data['user_id'])
+            self._update_cached_user(order_data['user_id'], is_first_usage=False)
+            logger.info("Order created: #%s for user %s", order.id, order_data['user_id'])
             return order.id
 
         except Exception as e:
-            logger.error(f"Error creating order: {e}")
+            logger.error("Error creating order: %s", e)
             session.rollback()
             raise
         finally:
@@ -348,7 +649,7 @@ class Database:
                 }
             return None
         except Exception as e:
-            logger.error(f"Error getting order {order_id}: {e}")
+            logger.error("Error getting order %s: %s", order_id, e)
             raise
         finally:
             session.close()
@@ -357,7 +658,7 @@ class Database:
         """Get user orders"""
         session = self.get_session()
         try:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
+            user = self._resolve_user(session, telegram_id)
             if not user:
                 return []
 
@@ -376,7 +677,7 @@ class Database:
                 for order in orders
             ]
         except Exception as e:
-            logger.error(f"Error getting orders for user {telegram_id}: {e}")
+            logger.error("Error getting orders for user %s: %s", telegram_id, e)
             raise
         finally:
             session.close()
@@ -389,24 +690,34 @@ class Database:
             if order:
                 order.status = status
                 session.commit()
-                logger.info(f"Order #{order_id} status updated to {status}")
+                logger.info("Order #%s status updated to %s", order_id, status)
                 return True
             return False
         except Exception as e:
-            logger.error(f"Error updating order {order_id} status: {e}")
+            logger.error("Error updating order %s status: %s", order_id, e)
             session.rollback()
             raise
         finally:
             session.close()
 
-    def get_all_orders(self):
-        """Get all orders"""
+    def get_orders_page(self, after_id: int = None, limit: int = None):
+        """Get a page of orders with items, ordered by ID (keyset pagination)"""
+        if limit is None:
+            limit = self.config.ADMIN_ORDERS_PAGE_SIZE
         session = self.get_session()
         try:
-            orders = session.query(Order).all()
-            result = []
-            for order in orders:
-                result.append({
+            # Позиции и названия товаров подгружаются одним запросом на страницу
+            query = session.query(Order).options(
+                selectinload(Order.items)
+                .joinedload(OrderItem.product)
+                .load_only(Product.name_ru)
+            )
+            if after_id is not None:
+                query = query.filter(Order.id > after_id)
+            orders = query.order_by(Order.id).limit(limit).all()
+
+            return [
+                {
                     'id': order.id,
                     'user_id': order.user_id,
                     'name': order.name,
@@ -419,14 +730,29 @@ class Database:
                             'product_id': item.product_id,
                             'quantity': item.quantity,
                             'price': item.price,
-                            'name': item.product.name_ru
+                            'name': item.product.name_ru if item.product else "Неизвестный продукт"
                         }
                         for item in order.items
                     ]
-                })
-            return result
+                }
+                for order in orders
+            ]
         except Exception as e:
-            logger.error(f"Error getting all orders: {e}")
+            logger.error("Error getting orders page after %s: %s", after_id, e)
             raise
         finally:
             session.close()
+
+    def iter_all_orders(self, page_size: int = None):
+        """Iterate over all orders page by page"""
+        after_id = None
+        while True:
+            page = self.get_orders_page(after_id, page_size)
+            if not page:
+                return
+            yield page
+            after_id = page[-1]['id']
+
+    def get_all_orders(self):
+        """Get all orders"""
+        return [order for page in self.iter_all_orders() for order in page]
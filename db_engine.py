@@ -0,0 +1,67 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+import logging
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+def _sqlite_pragmas(in_memory: bool):
+    """Обработчик connect: настройки применяются к каждому новому соединению"""
+    pragmas = [
+        ('busy_timeout', config.SQLITE_BUSY_TIMEOUT),
+        ('synchronous', config.SQLITE_SYNCHRONOUS),
+        ('cache_size', config.SQLITE_CACHE_SIZE),
+        ('mmap_size', config.SQLITE_MMAP_SIZE),
+    ]
+    # WAL хранится в самом файле базы; у базы в памяти его нет
+    if not in_memory and config.SQLITE_JOURNAL_MODE:
+        pragmas.insert(0, ('journal_mode', config.SQLITE_JOURNAL_MODE))
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def create_db_engine(url=None, **kwargs):
+    """Движок SQLAlchemy с общими настройками для бота, админки, init_db и миграций.
+
+    Для SQLite включается WAL: читатели (админка) не блокируют запись
+    (оформление заказа в боте), а писатель ждет busy_timeout вместо ошибки
+    "database is locked". Для PostgreSQL настраивается QueuePool.
+    """
+    url = make_url(url or config.DATABASE_URL)
+    is_sqlite = url.get_backend_name() == 'sqlite'
+    in_memory = is_sqlite and url.database in (None, '', ':memory:')
+
+    if not in_memory and 'poolclass' not in kwargs:
+        kwargs.setdefault('pool_size', config.DB_POOL_SIZE)
+        kwargs.setdefault('max_overflow', config.DB_MAX_OVERFLOW)
+        kwargs.setdefault('pool_timeout', config.DB_POOL_TIMEOUT)
+        if not is_sqlite:
+            # Сервер и сетевое оборудование закрывают простаивающие соединения
+            kwargs.setdefault('pool_recycle', config.DB_POOL_RECYCLE)
+            kwargs.setdefault('pool_pre_ping', config.DB_POOL_PRE_PING)
+
+    engine = create_engine(url, **kwargs)
+    if is_sqlite:
+        event.listen(engine, 'connect', _sqlite_pragmas(in_memory))
+    logger.debug("Database engine for %s", url.render_as_string(hide_password=True))
+    return engine
+
+
+def dialect_insert(dialect_name: str, table):
+    """INSERT с поддержкой on_conflict_do_update/on_conflict_do_nothing
+    для диалекта соединения (SQLite или PostgreSQL)"""
+    if dialect_name == 'postgresql':
+        return postgresql.insert(table)
+    if dialect_name == 'sqlite':
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upsert is not supported for {dialect_name}")
@@ -0,0 +1,115 @@
+import asyncio
+import functools
+import importlib.util
+import logging
+import time
+
+import httpx
+from telegram.request import HTTPXRequest
+
+from config import config
+from metrics import TELEGRAM_DURATION, TELEGRAM_ERRORS
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def http_version() -> str:
+    """HTTP/2, если он включен и установлен пакет h2, иначе HTTP/1.1"""
+    if not config.HTTP2:
+        return '1.1'
+    if importlib.util.find_spec('h2') is None:
+        logger.warning("HTTP/2 requested but h2 is not installed, falling back to HTTP/1.1")
+        return '1.1'
+    return '2'
+
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """Транспорт с повтором запросов, которые не удалось отправить.
+
+    Повторяются только ошибки установки соединения: запрос до сервера
+    не дошел, поэтому повтор безопасен даже для sendMessage.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, retries: int = None, delay: float = None):
+        self.transport = transport
+        self.retries = config.CONNECT_RETRIES if retries is None else retries
+        self.delay = config.RETRY_DELAY if delay is None else delay
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(self.retries + 1):
+            try:
+                return await self.transport.handle_async_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning("Connection to %s failed (%r), retry %s/%s in %ss",
+                               request.url.host, e, attempt + 1, self.retries, self.delay)
+                await asyncio.sleep(self.delay)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+def create_transport(pool_size: int, http2: bool) -> RetryTransport:
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=config.KEEPALIVE_EXPIRY
+    )
+    return RetryTransport(httpx.AsyncHTTPTransport(limits=limits, http1=True, http2=http2))
+
+
+def create_http_client(pool_size: int = None) -> httpx.AsyncClient:
+    """Клиент httpx с настройками из Config (для notifier.py и т.п.)"""
+    pool_size = pool_size or config.CONNECTION_POOL_SIZE
+    return httpx.AsyncClient(
+        transport=create_transport(pool_size, http_version() == '2'),
+        timeout=httpx.Timeout(
+            connect=config.CONNECT_TIMEOUT,
+            read=config.READ_TIMEOUT,
+            write=config.WRITE_TIMEOUT,
+            pool=config.POOL_TIMEOUT
+        )
+    )
+
+
+class BotRequest(HTTPXRequest):
+    """HTTPXRequest для python-telegram-bot с пулом, таймаутами и повторами из Config"""
+
+    def __init__(self, pool_size: int = None):
+        self.pool_size = pool_size or config.CONNECTION_POOL_SIZE
+        super().__init__(
+            connection_pool_size=self.pool_size,
+            connect_timeout=config.CONNECT_TIMEOUT,
+            read_timeout=config.READ_TIMEOUT,
+            write_timeout=config.WRITE_TIMEOUT,
+            pool_timeout=config.POOL_TIMEOUT,
+            http_version=http_version()
+        )
+
+    def _build_client(self) -> httpx.AsyncClient:
+        # Собственный транспорт заменяет limits/http2 клиента, поэтому задаем их в нем
+        kwargs = dict(self._client_kwargs)
+        kwargs['transport'] = create_transport(self.pool_size, self.http_version != '1.1')
+        return httpx.AsyncClient(**kwargs)
+
+    async def do_request(self, url, method, *args, **kwargs):
+        endpoint = url.rsplit('/', 1)[-1]
+        start = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(method=endpoint, error=e.__class__.__name__)
+            raise
+        finally:
+            TELEGRAM_DURATION.observe(time.perf_counter() - start, method=endpoint)
+        if code != 200:
+            TELEGRAM_ERRORS.inc(method=endpoint, error=str(code))
+        return code, payload
+
+
+def create_bot_requests():
+    """Отдельные пулы: для getUpdates (long polling держит соединение)
+    и для остальных вызовов Bot API"""
+    return BotRequest(), BotRequest(pool_size=config.GET_UPDATES_POOL_SIZE)
@@ -1,10 +1,10 @@
-from sqlalchemy import create_engine
 from models import Base
 from config import Config
+from db_engine import create_db_engine
 
 def init_db():
     config = Config()
-    engine = create_engine(config.DATABASE_URL)
+    engine = create_db_engine(config.DATABASE_URL)
     Base.metadata.create_all(engine)
 
 if __name__ == '__main__':
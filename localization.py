@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+from types import MappingProxyType
+
+from telegram import KeyboardButton, ReplyKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+LOCALES_DIR = os.path.join(os.path.dirname(__file__), 'locales')
+
+# Кнопка админ-панели не переводится
+ADMIN_PANEL_TEXT = "👑 Админ-панель"
+
+# Ключи кнопок меню в порядке приоритета: при совпадении текстов
+# побеждает первый (так же, как в прежней цепочке if/elif)
+MENU_ACTIONS = ('products', 'cart', 'clear_cart', 'back_to_menu', 'checkout', 'orders', 'settings')
+
+
+class Locales:
+    """Языковые таблицы из locales/*.json.
+
+    Файлы читаются один раз при создании. Для каждого языка строятся
+    неизменяемая таблица текстов и обратный индекс "текст кнопки -> действие",
+    а клавиатуры создаются один раз и затем берутся из кэша.
+    """
+
+    def __init__(self, locales_dir: str = None):
+        self.locales_dir = locales_dir or LOCALES_DIR
+        self.tables = {}
+        self._actions = {}
+        self._keyboards = {}
+        self._load()
+
+    def _load(self):
+        logger.info("Loading locales from: %s", self.locales_dir)
+        tables = {}
+        for filename in sorted(os.listdir(self.locales_dir)):
+            if filename.endswith('.json'):
+                language = filename.split('.')[0]
+                with open(os.path.join(self.locales_dir, filename), 'r', encoding='utf-8') as f:
+                    tables[language] = MappingProxyType(json.load(f))
+
+        self.tables = MappingProxyType(tables)
+        for language, table in tables.items():
+            actions = {ADMIN_PANEL_TEXT: 'admin_panel'}
+            for key in reversed(MENU_ACTIONS):
+                if key in table:
+                    actions[table[key].strip()] = key
+            self._actions[language] = MappingProxyType(actions)
+        logger.info("Available locales: %s", list(tables))
+
+    @property
+    def languages(self):
+        return list(self.tables)
+
+    def get_text(self, language: str, key: str) -> str:
+        """Получение текста из языковой таблицы"""
+        try:
+            return self.tables[language][key]
+        except KeyError:
+            logger.error("Missing translation key: %s for language: %s", key, language)
+            return f"Missing translation: {key}"
+
+    def action(self, language: str, text: str):
+        """Действие кнопки меню по ее тексту (None, если такой кнопки нет)"""
+        actions = self._actions.get(language)
+        return actions.get(text.strip()) if actions else None
+
+    def _keyboard(self, cache_key, build):
+        # Объекты PTB неизменяемы, поэтому одну клавиатуру можно отправлять всем
+        markup = self._keyboards.get(cache_key)
+        if markup is None:
+            markup = self._keyboards[cache_key] = ReplyKeyboardMarkup(build(), resize_keyboard=True)
+        return markup
+
+    def main_keyboard(self, language: str, is_admin: bool = False) -> ReplyKeyboardMarkup:
+        """Главное меню (с кнопкой админ-панели для администраторов)"""
+        def build():
+            keyboard = [
+                [
+                    KeyboardButton(self.get_text(language, "products")),
+                    KeyboardButton(self.get_text(language, "cart"))
+                ],
+                [
+                    KeyboardButton(self.get_text(language, "orders")),
+                    KeyboardButton(self.get_text(language, "settings"))
+                ]
+            ]
+            if is_admin:
+                keyboard.append([KeyboardButton(ADMIN_PANEL_TEXT)])
+            return keyboard
+        return self._keyboard(('main', language, bool(is_admin)), build)
+
+    def cart_keyboard(self, language: str) -> ReplyKeyboardMarkup:
+        """Клавиатура корзины: оформить / очистить / назад"""
+        return self._keyboard(('cart', language), lambda: [
+            [KeyboardButton(self.get_text(language, "checkout"))],
+            [KeyboardButton(self.get_text(language, "clear_cart"))],
+            [KeyboardButton(self.get_text(language, "back_to_menu"))]
+        ])
+
+    def admin_keyboard(self, language: str) -> ReplyKeyboardMarkup:
+        """Меню администратора"""
+        return self._keyboard(('admin', language), lambda: [
+            [KeyboardButton("➕ Добавить товар")],
+            [KeyboardButton("📝 Редактировать товар")],
+            [KeyboardButton("📋 Просмотр заказов")],
+            [KeyboardButton(self.get_text(language, "back_to_menu"))]
+        ])
+
+    def checkout_keyboard(self, language: str, request: str = None) -> ReplyKeyboardMarkup:
+        """Клавиатура шагов оформления: кнопка "назад в корзину" и, при
+        необходимости, запрос контакта ('contact') или локации ('location')"""
+        def build():
+            keyboard = []
+            if request == 'contact':
+                keyboard.append([KeyboardButton(self.get_text(language, "share_contact"), request_contact=True)])
+            elif request == 'location':
+                keyboard.append([KeyboardButton(self.get_text(language, "share_location"), request_location=True)])
+            keyboard.append([KeyboardButton(self.get_text(language, "back_to_cart"))])
+            return keyboard
+        return self._keyboard(('checkout', language, request), build)
+
+
+locales = Locales()
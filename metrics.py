@@ -0,0 +1,280 @@
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Границы корзин для числа SQL-запросов на одно обновление
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labelvalues, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labelvalues, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('', key, (), value) for key, value in items]
+
+
+class Gauge(Metric):
+    """Текущее значение; можно задать функцию, которая вызывается при выгрузке"""
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            try:
+                return [('', (), (), self.function())]
+            except Exception as e:
+                logger.warning("Gauge %s failed: %s", self.name, e)
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('', key, (), value) for key, value in items]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [счетчики корзин (последняя - +Inf), сумма]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', key, (('le', _format_value(bound)),), cumulative))
+            samples.append(('_sum', key, (), total))
+            samples.append(('_count', key, (), cumulative))
+        return samples
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames=(), function=None) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames, function)
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+registry = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HANDLER_DURATION = registry.histogram(
+    'bot_handler_duration_seconds', 'Duration of EcommerceBot handlers', ['handler'])
+HANDLER_ERRORS = registry.counter(
+    'bot_handler_errors_total', 'Exceptions raised by EcommerceBot handlers', ['handler'])
+DB_DURATION = registry.histogram(
+    'db_method_duration_seconds', 'Duration of Database methods', ['method'])
+DB_ERRORS = registry.counter(
+    'db_method_errors_total', 'Exceptions raised by Database methods', ['method'])
+DB_EXECUTOR_WAIT = registry.histogram(
+    'db_executor_wait_seconds', 'Time a Database call waited for a free executor thread')
+DB_WRITE_BATCH_SIZE = registry.histogram(
+    'db_write_batch_size', 'Write operations committed in one group-commit transaction', buckets=COUNT_BUCKETS)
+TELEGRAM_DURATION = registry.histogram(
+    'telegram_api_duration_seconds', 'Duration of Telegram Bot API HTTP requests', ['method'])
+TELEGRAM_ERRORS = registry.counter(
+    'telegram_api_errors_total', 'Failed Telegram Bot API HTTP requests', ['method', 'error'])
+SQL_STATEMENTS = registry.counter(
+    'sql_statements_total', 'Executed SQL statements', ['source'])
+HTTP_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Duration of Flask requests', ['endpoint'])
+SQL_PER_UPDATE = registry.histogram(
+    'sql_statements_per_update', 'SQL statements executed while handling one update', buckets=COUNT_BUCKETS)
+UPDATE_DURATION = registry.histogram(
+    'bot_update_duration_seconds', 'Total time spent handling one update')
+
+# Счетчик SQL-запросов текущего обновления. AsyncDatabase запускает
+# вызовы через contextvars.copy_context().run, поэтому счетчик виден и в потоках БД
+_sql_counter = contextvars.ContextVar('sql_counter', default=None)
+
+
+def timed_handler(func):
+    """Декоратор обработчика: гистограмма длительности и счетчик ошибок"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - start, handler=name)
+    return wrapper
+
+
+def call_db_method(func, *args, **kwargs):
+    """Вызов метода Database с замером длительности (в потоке БД)"""
+    name = getattr(func, '__name__', 'unknown')
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        DB_ERRORS.inc(method=name)
+        raise
+    finally:
+        DB_DURATION.observe(time.perf_counter() - start, method=name)
+
+
+async def track_update(coroutine):
+    """Обработка одного обновления с подсчетом SQL-запросов и общей длительности"""
+    counter = [0]
+    token = _sql_counter.set(counter)
+    start = time.perf_counter()
+    try:
+        return await coroutine
+    finally:
+        UPDATE_DURATION.observe(time.perf_counter() - start)
+        SQL_PER_UPDATE.observe(counter[0])
+        _sql_counter.reset(token)
+
+
+def instrument_engine(engine, source: str):
+    """Подсчет SQL-запросов движка SQLAlchemy"""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        SQL_STATEMENTS.inc(source=source)
+        counter = _sql_counter.get()
+        if counter is not None:
+            counter[0] += 1
+
+
+async def start_http_server(host: str, port: int):
+    """Небольшой HTTP-сервер с /metrics для процесса бота.
+
+    Если порт занят, бот продолжает работу без сервера метрик (возвращается None).
+    """
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(body=registry.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.warning("Metrics server disabled: cannot listen on %s:%s: %s", host, port, e)
+        await runner.cleanup()
+        return None
+    logger.info("Metrics server listening on %s:%s", host, port)
+    return runner
@@ -0,0 +1,46 @@
+"""cart unique user/product
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Ограничение могло уже создать Base.metadata.create_all (новая база, в том числе PostgreSQL)
+    inspector = sa.inspect(op.get_bind())
+    existing = {c['name'] for c in inspector.get_unique_constraints('cart')} | \
+        {i['name'] for i in inspector.get_indexes('cart')}
+    if 'uq_cart_user_product' in existing:
+        return
+
+    # Сливаем дубликаты строк корзины, оставшиеся от старого add_to_cart
+    op.execute(
+        """
+        UPDATE cart SET quantity = (
+            SELECT SUM(c.quantity) FROM cart c
+            WHERE c.user_id = cart.user_id AND c.product_id = cart.product_id
+        )
+        WHERE id IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id)
+        """
+    )
+    op.execute(
+        "DELETE FROM cart WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id)"
+    )
+    op.create_index('uq_cart_user_product', 'cart', ['user_id', 'product_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_cart_user_product', table_name='cart')
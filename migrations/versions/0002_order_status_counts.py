@@ -0,0 +1,40 @@
+"""order status counts
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Таблицу мог уже создать Base.metadata.create_all при запуске бота
+    if not sa.inspect(op.get_bind()).has_table('order_status_counts'):
+        op.create_table(
+            'order_status_counts',
+            sa.Column('status', sa.String(), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('status')
+        )
+
+    # Заполняем счетчики по уже существующим заказам
+    op.execute("DELETE FROM order_status_counts")
+    op.execute(
+        "INSERT INTO order_status_counts (status, count) "
+        "SELECT status, COUNT(*) FROM orders WHERE status IS NOT NULL GROUP BY status"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('order_status_counts')
@@ -0,0 +1,46 @@
+"""notification outbox
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Таблицу мог уже создать Base.metadata.create_all при запуске бота
+    if sa.inspect(op.get_bind()).has_table('notification_outbox'):
+        return
+
+    op.create_table(
+        'notification_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('chat_id', sa.Integer(), nullable=False),
+        sa.Column('text', sa.String(), nullable=False),
+        sa.Column('parse_mode', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notification_outbox_status', 'notification_outbox', ['status'])
+    op.create_index('ix_notification_outbox_next_attempt_at', 'notification_outbox', ['next_attempt_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notification_outbox_next_attempt_at', table_name='notification_outbox')
+    op.drop_index('ix_notification_outbox_status', table_name='notification_outbox')
+    op.drop_table('notification_outbox')
@@ -0,0 +1,36 @@
+"""bigint telegram ids
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ID пользователей Telegram не помещаются в 32 бита. В SQLite INTEGER
+    # и так 64-битный, менять тип нужно только на серверных БД (PostgreSQL)
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    op.alter_column('users', 'telegram_id', type_=sa.BigInteger(), existing_type=sa.Integer())
+    op.alter_column('notification_outbox', 'chat_id', type_=sa.BigInteger(),
+                    existing_type=sa.Integer(), existing_nullable=False)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        return
+    op.alter_column('notification_outbox', 'chat_id', type_=sa.Integer(),
+                    existing_type=sa.BigInteger(), existing_nullable=False)
+    op.alter_column('users', 'telegram_id', type_=sa.Integer(), existing_type=sa.BigInteger())
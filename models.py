@@ -1,15 +1,18 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, ForeignKey, Boolean, UniqueConstraint, event
+from sqlalchemy.orm import attributes
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
+from db_engine import dialect_insert
+
 Base = declarative_base()
 
 class User(Base):
     __tablename__ = 'users'
     
     id = Column(Integer, primary_key=True)
-    telegram_id = Column(Integer, unique=True, index=True)  
+    telegram_id = Column(BigInteger, unique=True, index=True)  
     language = Column(String)
     name = Column(String)
     phone = Column(String)
@@ -65,6 +68,9 @@ class OrderItem(Base):
 
 class Cart(Base):
     __tablename__ = 'cart'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'product_id', name='uq_cart_user_product'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), index=True)
@@ -73,3 +79,59 @@ class Cart(Base):
     
     user = relationship("User", back_populates="cart")
     product = relationship("Product", back_populates="cart_items")
+
+class OrderStatusCount(Base):
+    """Счетчик заказов по статусам, чтобы не делать COUNT(*) по всей таблице"""
+    __tablename__ = 'order_status_counts'
+
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class NotificationOutbox(Base):
+    """Очередь уведомлений пользователям, отправляемых фоновым воркером"""
+    __tablename__ = 'notification_outbox'
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    text = Column(String, nullable=False)
+    parse_mode = Column(String)
+    status = Column(String, default='pending', index=True)  # pending / sent / failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+def _bump_status_count(connection, status, delta):
+    if status is None:
+        return
+    table = OrderStatusCount.__table__
+    # Upsert вместо UPDATE + INSERT: без гонки при первом заказе с новым статусом
+    connection.execute(
+        dialect_insert(connection.dialect.name, table)
+        .values(status=status, count=delta)
+        .on_conflict_do_update(
+            index_elements=[table.c.status],
+            set_={'count': table.c.count + delta}
+        )
+    )
+
+
+# Счетчики обновляются в той же транзакции, что и сам заказ,
+# в том числе при правках через Flask-Admin
+@event.listens_for(Order, 'after_insert')
+def _count_inserted_order(mapper, connection, order):
+    _bump_status_count(connection, order.status, 1)
+
+
+@event.listens_for(Order, 'after_update')
+def _count_updated_order(mapper, connection, order):
+    history = attributes.get_history(order, 'status')
+    if history.deleted and history.added:
+        _bump_status_count(connection, history.deleted[0], -1)
+        _bump_status_count(connection, history.added[0], 1)
+
+
+@event.listens_for(Order, 'after_delete')
+def _count_deleted_order(mapper, connection, order):
+    _bump_status_count(connection, order.status, -1)
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import func, update
+from sqlalchemy.orm import sessionmaker
+
+from config import config
+from db_engine import create_db_engine
+from http_client import create_http_client
+from metrics import TELEGRAM_DURATION, TELEGRAM_ERRORS
+from models import Base, NotificationOutbox
+from send_scheduler import Priority, SendScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationWorker:
+    """Фоновая отправка уведомлений из таблицы notification_outbox.
+
+    Уведомления пишутся в outbox в той же транзакции, что и изменение
+    заказа, а воркер отправляет их пачками через один keep-alive клиент
+    с повторными попытками и экспоненциальной задержкой.
+    """
+
+    def __init__(self, session_factory):
+        self.Session = session_factory
+        self.url = f"{config.TELEGRAM_API_URL}/bot{config.BOT_TOKEN}/sendMessage"
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.scheduler = None
+
+    def start(self):
+        """Запуск воркера в отдельном потоке"""
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=asyncio.run, args=(self._run(),), name='notifier', daemon=True)
+        self._thread.start()
+        logger.info("Notification worker started")
+
+    def stop(self, timeout: float = None):
+        """Остановка воркера после текущей пачки"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def notify(self):
+        """Разбудить воркер сразу после записи нового уведомления"""
+        if not self.running:
+            # При NOTIFY_WORKER_ENABLED=0 уведомления отправляет отдельный процесс notifier.py;
+            # если он не запущен, outbox только растет
+            logger.warning("Notification queued but no worker runs in this process; "
+                           "it will be sent only if 'python notifier.py' is running")
+        self._wakeup.set()
+
+    def _claim_batch(self):
+        """Захват пачки готовых к отправке уведомлений.
+
+        Вместо отдельного статуса сдвигаем next_attempt_at на время аренды:
+        если процесс упадет, уведомления снова станут доступны.
+        """
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            candidates = session.query(NotificationOutbox.id) \
+                .filter(NotificationOutbox.status == 'pending',
+                        NotificationOutbox.next_attempt_at <= now) \
+                .order_by(NotificationOutbox.next_attempt_at) \
+                .limit(config.NOTIFY_BATCH_SIZE) \
+                .all()
+
+            lease_until = now + timedelta(seconds=config.NOTIFY_LEASE_SECONDS)
+            claimed = []
+            for (notification_id,) in candidates:
+                result = session.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.id == notification_id,
+                           NotificationOutbox.status == 'pending',
+                           NotificationOutbox.next_attempt_at <= now)
+                    .values(next_attempt_at=lease_until)
+                )
+                if result.rowcount:
+                    claimed.append(notification_id)
+
+            notifications = []
+            if claimed:
+                notifications = session.query(
+                    NotificationOutbox.id,
+                    NotificationOutbox.chat_id,
+                    NotificationOutbox.text,
+                    NotificationOutbox.parse_mode,
+                    NotificationOutbox.attempts
+                ).filter(NotificationOutbox.id.in_(claimed)).all()
+            session.commit()
+            return notifications
+        except Exception as e:
+            logger.error("Error claiming notifications: %s", e)
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _next_due_in(self) -> float:
+        """Секунды до ближайшего отложенного уведомления (не больше интервала опроса)"""
+        session = self.Session()
+        try:
+            next_attempt_at = session.query(func.min(NotificationOutbox.next_attempt_at)) \
+                .filter(NotificationOutbox.status == 'pending') \
+                .scalar()
+        finally:
+            session.close()
+        if next_attempt_at is None:
+            return config.NOTIFY_POLL_INTERVAL
+        delay = (next_attempt_at - datetime.utcnow()).total_seconds()
+        return min(max(delay, 0), config.NOTIFY_POLL_INTERVAL)
+
+    def _save_results(self, results):
+        """Сохранение результатов отправки пачки"""
+        session = self.Session()
+        try:
+            now = datetime.utcnow()
+            for notification, error, retry_after, throttled in results:
+                if error is None:
+                    values = {'status': 'sent', 'last_error': None}
+                elif throttled:
+                    # 429 - не ошибка доставки: ждем retry_after, попытку не засчитываем,
+                    # иначе долгий flood wait исчерпал бы NOTIFY_MAX_ATTEMPTS
+                    values = {'last_error': error, 'next_attempt_at': now + timedelta(seconds=retry_after)}
+                    logger.info("Notification %s throttled, retry in %ss", notification.id, retry_after)
+                else:
+                    attempts = notification.attempts + 1
+                    values = {'attempts': attempts, 'last_error': error}
+                    if retry_after is None or attempts >= config.NOTIFY_MAX_ATTEMPTS:
+                        values['status'] = 'failed'
+                        logger.error("Notification %s to %s failed: %s", notification.id, notification.chat_id, error)
+                    else:
+                        values['next_attempt_at'] = now + timedelta(seconds=retry_after)
+                        logger.warning("Notification %s will be retried in %ss: %s", notification.id, retry_after, error)
+                session.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.id == notification.id)
+                    .values(**values)
+                )
+            session.commit()
+        except Exception as e:
+            logger.error("Error saving notification results: %s", e)
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _backoff(self, attempts: int) -> float:
+        return min(config.NOTIFY_RETRY_DELAY * 2 ** attempts, config.NOTIFY_MAX_RETRY_DELAY)
+
+    async def _send(self, client: httpx.AsyncClient, notification):
+        """Отправка одного уведомления: (notification, ошибка, задержка до повтора, ответ 429)"""
+        data = {"chat_id": notification.chat_id, "text": notification.text}
+        if notification.parse_mode:
+            data["parse_mode"] = notification.parse_mode
+
+        await self.scheduler.acquire(notification.chat_id, Priority.NOTIFICATION)
+        start = time.perf_counter()
+        try:
+            response = await client.post(self.url, json=data)
+        except httpx.HTTPError as e:
+            TELEGRAM_ERRORS.inc(method='sendMessage', error=e.__class__.__name__)
+            return notification, f"{e.__class__.__name__}: {e}", self._backoff(notification.attempts), False
+        finally:
+            TELEGRAM_DURATION.observe(time.perf_counter() - start, method='sendMessage')
+
+        if response.status_code == 200:
+            return notification, None, None, False
+        TELEGRAM_ERRORS.inc(method='sendMessage', error=str(response.status_code))
+
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        error = f"{response.status_code}: {payload.get('description', response.text)}"
+
+        if response.status_code == 429:
+            retry_after = payload.get('parameters', {}).get('retry_after', 1)
+            self.scheduler.pause(retry_after)
+            return notification, error, retry_after, True
+        if response.status_code >= 500:
+            return notification, error, self._backoff(notification.attempts), False
+        # 400/403 и т.п. - повтор не поможет (чат не найден, бот заблокирован)
+        return notification, error, None, False
+
+    async def _run(self):
+        # Планировщик привязан к event loop потока воркера
+        self.scheduler = SendScheduler(global_rate=config.NOTIFY_GLOBAL_RATE)
+        await self.scheduler.start()
+        async with create_http_client(pool_size=config.NOTIFY_CONCURRENCY) as client:
+            while not self._stopping.is_set():
+                self._wakeup.clear()
+                try:
+                    batch = await asyncio.to_thread(self._claim_batch)
+                    if batch:
+                        results = await asyncio.gather(*(self._send(client, n) for n in batch))
+                        await asyncio.to_thread(self._save_results, results)
+                        continue
+                    timeout = await asyncio.to_thread(self._next_due_in)
+                except Exception as e:
+                    logger.error("Notification worker error: %s", e, exc_info=True)
+                    timeout = config.NOTIFY_POLL_INTERVAL
+
+                # Ждем нового уведомления, повторной попытки или следующего опроса
+                await asyncio.to_thread(self._wakeup.wait, timeout)
+
+        await self.scheduler.stop()
+        logger.info("Notification worker stopped")
+
+
+if __name__ == '__main__':
+    # Отдельный процесс-отправитель, если веб-приложение запущено без него
+    logging.basicConfig(level=logging.INFO)
+    engine = create_db_engine()
+    Base.metadata.create_all(engine)
+    worker = NotificationWorker(sessionmaker(bind=engine))
+    worker.start()
+    try:
+        worker._thread.join()
+    except KeyboardInterrupt:
+        worker.stop()
@@ -0,0 +1,44 @@
+from collections import namedtuple
+
+# Позиция расчета; у бонусных позиций цена и сумма равны нулю
+QuoteLine = namedtuple('QuoteLine', ['product_id', 'name', 'quantity', 'price', 'subtotal'])
+Quote = namedtuple('Quote', ['lines', 'bonus_lines', 'total'])
+
+# Бонус первой покупки: столько единиц каждого акционного товара бесплатно
+FIRST_ORDER_BONUS = 2
+# Обычный бонус: одна бесплатная единица акционного товара за каждые PROMO_STEP купленных
+PROMO_STEP = 5
+
+
+class PricingEngine:
+    """Единственное место, где считаются сумма корзины и бонусы по акциям.
+
+    quote() принимает снимок корзины - позиции с ключами product_id, quantity,
+    price, is_promo и (для показа) name, как их возвращает Database.get_cart.
+    Расчет не кэшируется: он дешевле построения ключа по содержимому корзины,
+    а счетчика версий, который учитывал бы и цены из админки, у бота нет.
+    """
+
+    def quote(self, items, is_first_usage: bool) -> Quote:
+        """Расчет корзины: оплачиваемые позиции, бонусные позиции и итог"""
+        lines = []
+        bonus_lines = []
+        total = 0
+        for item in items:
+            product_id, quantity, price = item['product_id'], item['quantity'], item['price']
+            name = item.get('name')
+            subtotal = price * quantity
+            total += subtotal
+            lines.append(QuoteLine(product_id, name, quantity, price, subtotal))
+
+            if item['is_promo'] and is_first_usage:
+                bonus = FIRST_ORDER_BONUS
+            elif item['is_promo'] and quantity >= PROMO_STEP:
+                bonus = quantity // PROMO_STEP
+            else:
+                continue
+            bonus_lines.append(QuoteLine(product_id, name, bonus, 0, 0))
+        return Quote(tuple(lines), tuple(bonus_lines), total)
+
+
+pricing = PricingEngine()
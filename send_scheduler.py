@@ -0,0 +1,219 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from enum import IntEnum
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import config
+from metrics import registry
+from update_processor import slot_released
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Приоритет исходящего сообщения: чем меньше, тем раньше"""
+    CHECKOUT = 0  # подтверждения заказов
+    INTERACTIVE = 1  # обычные ответы пользователю
+    NOTIFICATION = 2  # уведомления о статусе заказа
+    BULK = 3  # массовый вывод для администратора
+
+
+class TokenBucket:
+    """Токен-бакет с резервированием: токены могут уходить в минус,
+    тогда каждый следующий запрос ждет свою очередь"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Сколько ждать до появления токена"""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self) -> float:
+        """Занять токен и вернуть время ожидания до его появления"""
+        wait = self.delay()
+        self.tokens -= 1
+        return wait
+
+    @property
+    def idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class SendScheduler:
+    """Планировщик исходящих запросов к Telegram.
+
+    Соблюдает лимит на каждый чат (токен-бакет на чат) и общий лимит бота
+    (общий бакет, который раздает токены по приоритету), а после 429
+    приостанавливает отправку на retry_after.
+    Работает в одном event loop: бот и воркер уведомлений создают свои экземпляры
+    и делят между собой SEND_GLOBAL_RATE (воркеру - NOTIFY_GLOBAL_RATE).
+    """
+
+    def __init__(self, global_rate: float = None, chat_rate: float = None, chat_burst: float = None,
+                 group_rate: float = None, max_retries: int = None):
+        self.global_rate = global_rate or config.SEND_GLOBAL_RATE - config.NOTIFY_GLOBAL_RATE
+        self.chat_rate = chat_rate or config.SEND_CHAT_RATE
+        self.chat_burst = chat_burst or config.SEND_CHAT_BURST
+        self.group_rate = group_rate or config.SEND_GROUP_RATE
+        self.max_retries = config.SEND_MAX_RETRIES if max_retries is None else max_retries
+
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._chats = OrderedDict()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._paused_until = 0
+        self._wakeup = None
+        self._dispatcher = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество запросов, ожидающих общего токена"""
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def start(self):
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        # Отпускаем оставшиеся запросы, чтобы они не зависли навсегда
+        for _, _, future in self._waiters:
+            if not future.done():
+                future.set_result(None)
+        self._waiters.clear()
+
+    def pause(self, seconds: float):
+        """Приостановить все отправки (после ответа 429)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        logger.warning("Flood limit hit, pausing sends for %ss", seconds)
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательные chat_id - группы и каналы, у них свой лимит
+            is_group = isinstance(chat_id, int) and chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = TokenBucket(rate, 1 if is_group else self.chat_burst)
+            self._chats[chat_id] = bucket
+        self._chats.move_to_end(chat_id)
+
+        # Полные бакеты давно не писавших чатов ничего не ограничивают - удаляем
+        while len(self._chats) > config.SEND_CHAT_BUCKETS:
+            oldest_id, oldest = next(iter(self._chats.items()))
+            if not oldest.idle:
+                break
+            del self._chats[oldest_id]
+        return bucket
+
+    async def acquire(self, chat_id=None, priority: int = Priority.INTERACTIVE):
+        """Дождаться разрешения на отправку в чат"""
+        if self._dispatcher is None:
+            await self.start()
+
+        wait = self._chat_bucket(chat_id).reserve() if chat_id is not None else 0
+        if wait > 0 or self._busy():
+            # Пока чат ждет своего лимита, слот обработки обновлений нужен другим чатам
+            async with slot_released():
+                await self._wait_turn(wait, priority)
+        else:
+            await self._wait_turn(0, priority)
+
+    def _busy(self) -> bool:
+        """Придется ли ждать общего токена"""
+        return bool(self._waiters) or self._paused_until > time.monotonic() or self._global.delay() > 0
+
+    async def _wait_turn(self, chat_wait: float, priority: int):
+        if chat_wait > 0:
+            await asyncio.sleep(chat_wait)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._wakeup.set()
+        await future
+
+    async def submit(self, chat_id, callback, priority: int = Priority.INTERACTIVE):
+        """Выполнить отправку через планировщик с повтором после 429"""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(chat_id, priority)
+            try:
+                return await callback()
+            except RetryAfter as e:
+                self.pause(e.retry_after)
+                if attempt == self.max_retries:
+                    raise
+
+    async def _dispatch(self):
+        """Раздача общих токенов ожидающим запросам в порядке приоритета"""
+        while True:
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = max(self._paused_until - time.monotonic(), self._global.delay())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            self._global.reserve()
+            _, _, future = heapq.heappop(self._waiters)
+            future.set_result(None)
+
+
+class TelegramRateLimiter(BaseRateLimiter[int]):
+    """Подключение SendScheduler к python-telegram-bot.
+
+    Приоритет передается через rate_limit_args, например
+    reply_text(..., rate_limit_args=Priority.CHECKOUT).
+    """
+
+    # Только эти запросы расходуют лимиты, остальные (answerCallbackQuery и т.п.) идут сразу
+    THROTTLED_PREFIXES = ('send', 'edit', 'copy', 'forward')
+
+    def __init__(self, scheduler: SendScheduler = None):
+        self.scheduler = scheduler or SendScheduler()
+        registry.gauge('telegram_send_queue_depth', 'Outgoing requests waiting for the global rate limit') \
+            .set_function(lambda: self.scheduler.queue_depth)
+
+    async def initialize(self) -> None:
+        await self.scheduler.start()
+
+    async def shutdown(self) -> None:
+        await self.scheduler.stop()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if not endpoint.startswith(self.THROTTLED_PREFIXES):
+            return await callback(*args, **kwargs)
+
+        priority = Priority.INTERACTIVE if rate_limit_args is None else rate_limit_args
+        return await self.scheduler.submit(
+            data.get('chat_id'),
+            lambda: callback(*args, **kwargs),
+            priority
+        )
@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Модули проекта лежат в корне репозитория
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# config читает окружение при импорте: токен обязателен, а база по умолчанию -
+# shop.db в рабочем каталоге, поэтому модули, создающие движок при импорте (app.py),
+# работают с временным файлом; воркер уведомлений в тестах не запускается
+_tmp = tempfile.mkdtemp(prefix='cleanwaterbot-tests-')
+os.environ['BOT_TOKEN'] = 'test-token'
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp, 'app.db')}"
+os.environ['NOTIFY_WORKER_ENABLED'] = '0'
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    """URL отдельной SQLite-базы для теста"""
+    return f"sqlite:///{tmp_path / 'test.db'}"
@@ -0,0 +1,197 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import metrics
+from async_database import AsyncDatabase
+from cart_store import MemoryCartStore
+from database import Database
+from models import Cart, Product
+
+
+class FakeTable:
+    """Таблица cart в виде словаря telegram_id -> {product_id: quantity}"""
+
+    def __init__(self, carts=None):
+        self.carts = carts or {}
+        self.loads = []
+        self.saves = []
+
+    def load(self, telegram_id):
+        self.loads.append(telegram_id)
+        return dict(self.carts.get(telegram_id, {}))
+
+    def save(self, carts):
+        self.saves.append(carts)
+        self.carts.update(carts)
+
+
+@pytest.fixture
+def table():
+    return FakeTable({1: {10: 2}})
+
+
+@pytest.fixture
+def make_store(table):
+    stores = []
+
+    def make(**kwargs):
+        kwargs.setdefault('max_size', 100)
+        kwargs.setdefault('ttl', 0)
+        # Фоновая запись не должна вмешиваться: flush() вызывает сам тест
+        kwargs.setdefault('flush_interval', 3600)
+        store = MemoryCartStore(table.load, table.save, **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_cart_is_loaded_once_and_flushed_when_dirty(table, make_store):
+    store = make_store()
+    assert store.get(1) == {10: 2}
+    assert store.adjust(1, 10, 3) == 5
+    assert store.adjust(1, 11, -1) == 0
+    assert table.loads == [1]
+    assert table.carts[1] == {10: 2}
+
+    assert store.flush() == 1
+    assert table.carts[1] == {10: 5}
+    # Записанная корзина больше не грязная
+    assert store.flush() == 0
+
+
+def test_zero_quantity_removes_item(table, make_store):
+    store = make_store()
+    assert store.set_quantity(1, 10, 0) is True
+    assert store.set_quantity(1, 99, 1) is False
+    store.flush()
+    assert table.carts[1] == {}
+
+
+def test_change_during_flush_stays_dirty(table, make_store):
+    store = make_store()
+    store.adjust(1, 10, 1)
+
+    save = table.save
+
+    def save_and_change(carts):
+        save(carts)
+        store.adjust(1, 10, 1)
+
+    store._save = save_and_change
+    assert store.flush() == 1
+    assert table.carts[1] == {10: 3}
+
+    store._save = save
+    assert store.flush() == 1
+    assert table.carts[1] == {10: 4}
+
+
+def test_only_flushed_carts_are_evicted(table, make_store):
+    store = make_store(max_size=2)
+    for telegram_id in (1, 2, 3):
+        store.adjust(telegram_id, 10, 1)
+    # Все три корзины грязные: вытеснять нельзя, даже сверх max_size
+    assert len(store._carts) == 3
+
+    store.flush()
+    assert list(store._carts) == [2, 3]
+
+    # Вытесненная корзина снова читается из таблицы
+    assert store.get(1) == {10: 3}
+    assert table.loads.count(1) == 2
+
+
+def test_idle_flushed_carts_expire(table, make_store):
+    store = make_store(ttl=0.05)
+    store.adjust(1, 10, 1)
+    time.sleep(0.1)
+    # Грязная корзина не истекает, пока не записана
+    assert store.get(1) == {10: 3}
+
+    store.flush()
+    time.sleep(0.1)
+    store.flush()
+    assert 1 not in store._carts
+
+
+def test_clear_and_close_write_pending_changes(table, make_store):
+    store = make_store()
+    store.adjust(2, 10, 4)
+    store.clear(1)
+    store.close()
+    assert table.carts == {1: {}, 2: {10: 4}}
+
+
+def test_order_during_flush_does_not_restore_cart(db_url, monkeypatch):
+    monkeypatch.setenv('CART_STORE', 'memory')
+    db = Database(db_url)
+    try:
+        session = db.get_session()
+        session.add(Product(id=1, name_ru='Water', price=10, is_promo=False))
+        session.commit()
+        session.close()
+        db.add_to_cart(7, 1, 3)
+
+        # Запись корзины, снимок которой сделан до заказа, заканчивается после него
+        save = db.carts._save
+        snapshot_taken = threading.Event()
+
+        def slow_save(carts):
+            snapshot_taken.set()
+            time.sleep(0.2)
+            save(carts)
+
+        db.carts._save = slow_save
+        flush = threading.Thread(target=db.carts.flush)
+        flush.start()
+        snapshot_taken.wait()
+        db.create_order({'user_id': 7, 'name': 'Test', 'phone': '+998', 'address': 'Street'})
+        flush.join()
+
+        session = db.get_session()
+        try:
+            assert session.query(Cart).count() == 0
+        finally:
+            session.close()
+        assert db.get_cart(7) == []
+    finally:
+        db.close()
+
+
+def test_cart_clicks_do_not_touch_the_database(db_url, monkeypatch):
+    monkeypatch.setenv('CART_STORE', 'memory')
+    db = Database(db_url)
+    try:
+        session = db.get_session()
+        session.add(Product(id=1, name_ru='Water', price=10, is_promo=False))
+        session.commit()
+        session.close()
+
+        async def click():
+            # Как обработчик ➕: изменение, каталог и количества для клавиатуры
+            await async_db.adjust_cart_quantity(7, 1, 1)
+            await async_db.get_products()
+            return await async_db.get_cart_quantities(7)
+
+        async def run():
+            await click()  # первая загрузка корзины и каталога
+            counter = [0]
+            token = metrics._sql_counter.set(counter)
+            try:
+                quantities = await click()
+            finally:
+                metrics._sql_counter.reset(token)
+            return quantities, counter[0]
+
+        async_db = AsyncDatabase(db, max_workers=2)
+        quantities, statements = asyncio.run(run())
+        assert quantities == {1: 2}
+        assert statements == 0
+    finally:
+        db.close()
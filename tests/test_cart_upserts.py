@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from database import Database
+from models import Cart, Product
+
+
+@pytest.fixture
+def db(db_url):
+    db = Database(db_url)
+    session = db.get_session()
+    session.add(Product(id=1, name_ru='Water', price=10, is_promo=False))
+    session.commit()
+    session.close()
+    yield db
+    db.close()
+
+
+def cart_rows(db):
+    session = db.get_session()
+    try:
+        return [(row.product_id, row.quantity) for row in session.query(Cart).order_by(Cart.id)]
+    finally:
+        session.close()
+
+
+def test_adjust_returns_new_quantity(db):
+    assert db.adjust_cart_quantity(7, 1, 1) == 1
+    assert db.adjust_cart_quantity(7, 1, 2) == 3
+    assert db.adjust_cart_quantity(7, 1, -1) == 2
+    assert cart_rows(db) == [(1, 2)]
+
+
+def test_quantity_is_clamped_at_zero_and_row_deleted(db):
+    db.adjust_cart_quantity(7, 1, 2)
+    assert db.adjust_cart_quantity(7, 1, -5) == 0
+    assert cart_rows(db) == []
+    # Уменьшение отсутствующей позиции не создает строку и пользователя
+    assert db.adjust_cart_quantity(8, 1, -1) == 0
+    assert cart_rows(db) == []
+    assert db.get_user_identity(8) is None
+
+
+def test_add_to_cart_merges_into_one_row(db):
+    db.add_to_cart(7, 1)
+    db.add_to_cart(7, 1, 4)
+    assert cart_rows(db) == [(1, 5)]
+
+
+def test_concurrent_increments_collapse_into_one_row(db):
+    db.set_language(7, 'ru')
+    barrier = threading.Barrier(8)
+
+    def click():
+        barrier.wait()
+        for _ in range(5):
+            db.adjust_cart_quantity(7, 1, 1)
+
+    threads = [threading.Thread(target=click) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # uq_cart_user_product: одна строка, ни одно нажатие не потеряно
+    assert cart_rows(db) == [(1, 40)]
+
+
+def test_missing_unique_index_is_reported(db_url):
+    Database(db_url).close()
+    # База, созданная до миграции 0001: без уникального индекса корзины
+    db = Database(db_url)
+    with db.engine.begin() as connection:
+        connection.execute(text("CREATE TABLE cart_old AS SELECT * FROM cart"))
+        connection.execute(text("DROP TABLE cart"))
+        connection.execute(text("ALTER TABLE cart_old RENAME TO cart"))
+    db.close()
+    with pytest.raises(RuntimeError, match='alembic upgrade head'):
+        Database(db_url)
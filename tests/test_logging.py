@@ -0,0 +1,36 @@
+import logging
+import queue
+
+from utils import LazyQueueHandler
+
+
+def make_record(msg, *args):
+    return logging.LogRecord('test', logging.INFO, __file__, 1, msg, args, None)
+
+
+def test_mutable_args_are_formatted_before_queueing():
+    handler = LazyQueueHandler(queue.Queue())
+    cart = [{'product_id': 1, 'quantity': 1}]
+    record = make_record("Cart: %s", cart)
+    handler.emit(record)
+    cart[0]['quantity'] = 5
+
+    queued = handler.queue.get_nowait()
+    assert queued.getMessage() == "Cart: [{'product_id': 1, 'quantity': 1}]"
+    assert queued.args is None
+
+
+def test_scalar_args_stay_deferred():
+    handler = LazyQueueHandler(queue.Queue())
+    handler.emit(make_record("User %s pressed %s", 7, 'increase'))
+
+    queued = handler.queue.get_nowait()
+    assert queued.msg == "User %s pressed %s"
+    assert queued.args == (7, 'increase')
+    assert queued.getMessage() == "User 7 pressed increase"
+
+
+def test_mapping_args_are_formatted():
+    handler = LazyQueueHandler(queue.Queue())
+    handler.emit(make_record("%(user)s", {'user': 7}))
+    assert handler.queue.get_nowait().getMessage() == "7"
@@ -0,0 +1,11 @@
+import logging
+
+from notifier import NotificationWorker
+
+
+def test_notify_without_running_worker_warns(caplog):
+    worker = NotificationWorker(session_factory=None)
+    with caplog.at_level(logging.WARNING, logger='notifier'):
+        worker.notify()
+    assert not worker.running
+    assert "no worker runs in this process" in caplog.text
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as admin_app
+from models import Base, Order, OrderStatusCount
+
+
+@pytest.fixture
+def client():
+    Base.metadata.create_all(admin_app.engine)
+    session = admin_app.Session()
+    try:
+        session.query(Order).delete()
+        session.query(OrderStatusCount).delete()
+        session.commit()
+
+        # Пять заказов, у двух пар одинаковое время: порядок внутри пары задает id
+        start = datetime(2024, 1, 1, 12, 0, 0)
+        for created_at, status in [
+            (start, 'new'),
+            (start + timedelta(minutes=1), 'new'),
+            (start + timedelta(minutes=1), 'delivered'),
+            (start + timedelta(minutes=2), 'new'),
+            (start + timedelta(minutes=2), 'new'),
+        ]:
+            session.add(Order(user_id=1, total_amount=10, status=status, created_at=created_at,
+                              name='Test', phone='+998', address='Street'))
+        session.commit()
+        expected = [order.id for order in session.query(Order).order_by(Order.created_at.desc(), Order.id.desc())]
+    finally:
+        session.close()
+
+    admin_app.app.config['TESTING'] = True
+    with admin_app.app.test_client() as client:
+        client.expected_ids = expected
+        yield client
+
+
+def fetch_all(client, **params):
+    """Пройти все страницы по next_cursor и вернуть id заказов"""
+    ids = []
+    cursor = None
+    for _ in range(10):
+        query = dict(params, **({'cursor': cursor} if cursor else {}))
+        data = client.get('/api/orders', query_string=query).get_json()
+        ids.extend(order['id'] for order in data['orders'])
+        if not data['has_next']:
+            assert data['next_cursor'] is None
+            return ids
+        cursor = data['next_cursor']
+    pytest.fail("pagination did not terminate")
+
+
+def test_cursor_pages_cover_all_orders_once(client):
+    assert fetch_all(client, per_page=2) == client.expected_ids
+
+
+def test_cursor_breaks_ties_by_id(client):
+    first = client.get('/api/orders', query_string={'per_page': 1}).get_json()
+    second = client.get('/api/orders', query_string={'per_page': 1, 'cursor': first['next_cursor']}).get_json()
+    # Второй заказ с тем же created_at не пропущен и не повторен
+    assert [first['orders'][0]['id'], second['orders'][0]['id']] == client.expected_ids[:2]
+
+
+def test_status_filter_and_total(client):
+    data = client.get('/api/orders', query_string={'status': 'new', 'per_page': 10}).get_json()
+    assert data['total_orders'] == 4
+    assert {order['status'] for order in data['orders']} == {'new'}
+    assert fetch_all(client, status='new', per_page=3) == [order['id'] for order in data['orders']]
+
+
+@pytest.mark.parametrize('cursor', ['garbage', 'not-a-date_5', '2024-01-01T12:00:00_x'])
+def test_bad_cursor_returns_400(client, cursor):
+    response = client.get('/api/orders', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_page_without_cursor_returns_400(client):
+    response = client.get('/api/orders', query_string={'page': 5})
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_page_is_echoed_with_cursor(client):
+    first = client.get('/api/orders', query_string={'per_page': 2}).get_json()
+    assert first['current_page'] == 1
+    second = client.get('/api/orders', query_string={'per_page': 2, 'page': 2,
+                                                     'cursor': first['next_cursor']}).get_json()
+    assert second['current_page'] == 2
+    assert [order['id'] for order in second['orders']] == client.expected_ids[2:4]
+
+
+def test_non_numeric_page_returns_400(client):
+    assert client.get('/api/orders', query_string={'page': 'two'}).status_code == 400
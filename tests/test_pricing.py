@@ -0,0 +1,47 @@
+import pytest
+
+from pricing import FIRST_ORDER_BONUS, PROMO_STEP, Quote, QuoteLine, pricing
+
+
+def item(product_id, quantity, price, is_promo=False, name=None):
+    return {'product_id': product_id, 'quantity': quantity, 'price': price, 'is_promo': is_promo, 'name': name}
+
+
+def test_empty_cart():
+    assert pricing.quote([], is_first_usage=True) == Quote((), (), 0)
+
+
+def test_total_and_lines():
+    quote = pricing.quote([item(1, 2, 10.5, name='Water'), item(2, 1, 3)], is_first_usage=False)
+    assert quote.lines == (QuoteLine(1, 'Water', 2, 10.5, 21.0), QuoteLine(2, None, 1, 3, 3))
+    assert quote.bonus_lines == ()
+    assert quote.total == 24.0
+
+
+def test_first_order_bonus_for_each_promo_item():
+    quote = pricing.quote([item(1, 1, 10, is_promo=True), item(2, 7, 5), item(3, 12, 1, is_promo=True)],
+                          is_first_usage=True)
+    # Бонус первой покупки заменяет обычный, даже если он был бы больше
+    assert quote.bonus_lines == (QuoteLine(1, None, FIRST_ORDER_BONUS, 0, 0),
+                                 QuoteLine(3, None, FIRST_ORDER_BONUS, 0, 0))
+    assert quote.total == 10 + 35 + 12
+
+
+@pytest.mark.parametrize('quantity, bonus', [
+    (PROMO_STEP - 1, 0),
+    (PROMO_STEP, 1),
+    (PROMO_STEP * 2 - 1, 1),
+    (PROMO_STEP * 3, 3),
+])
+def test_promo_step_bonus(quantity, bonus):
+    quote = pricing.quote([item(1, quantity, 2, is_promo=True)], is_first_usage=False)
+    assert quote.bonus_lines == ((QuoteLine(1, None, bonus, 0, 0),) if bonus else ())
+    # Бонусные единицы не входят в сумму
+    assert quote.total == quantity * 2
+
+
+def test_order_rows_without_names():
+    # create_order передает строки без названий
+    quote = pricing.quote([{'product_id': 1, 'quantity': 5, 'price': 4, 'is_promo': True}], is_first_usage=False)
+    assert quote.lines[0].name is None
+    assert quote.total == 20
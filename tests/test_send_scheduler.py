@@ -0,0 +1,54 @@
+import asyncio
+import time
+from datetime import datetime
+
+from telegram import Chat, Message, Update
+
+from send_scheduler import SendScheduler
+from update_processor import ChatOrderedUpdateProcessor
+
+
+def make_update(update_id, chat_id):
+    return Update(update_id, message=Message(update_id, datetime.now(), Chat(chat_id, Chat.PRIVATE)))
+
+
+def test_chat_rate_limit_wait_does_not_block_other_chats():
+    finished = {}
+
+    async def run():
+        scheduler = SendScheduler(global_rate=100, chat_rate=2, chat_burst=1)
+        processor = ChatOrderedUpdateProcessor(concurrency=1)
+        started = time.monotonic()
+
+        async def reply(chat_id, messages):
+            for _ in range(messages):
+                await scheduler.acquire(chat_id)
+            finished[chat_id] = time.monotonic() - started
+
+        try:
+            # Чат 1 упирается в свой лимит (2 сообщения в секунду) и ждет,
+            # а единственный слот обработки тем временем достается чату 2
+            slow = asyncio.create_task(processor.process_update(make_update(1, 1), reply(1, 3)))
+            await asyncio.sleep(0.01)
+            await processor.process_update(make_update(2, 2), reply(2, 1))
+            await slow
+        finally:
+            await scheduler.stop()
+        return processor
+
+    processor = asyncio.run(run())
+    assert finished[2] < 0.2
+    assert finished[1] >= 0.9
+    assert processor.in_flight == 0
+
+
+def test_scheduler_works_outside_the_update_processor():
+    async def run():
+        scheduler = SendScheduler(global_rate=100, chat_rate=100, chat_burst=1)
+        try:
+            for _ in range(3):
+                await scheduler.acquire(5)
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(run())
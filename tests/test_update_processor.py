@@ -0,0 +1,57 @@
+import asyncio
+from datetime import datetime
+
+from telegram import Chat, Message, Update
+
+from update_processor import ChatOrderedUpdateProcessor
+
+
+def make_update(update_id, chat_id):
+    chat = Chat(chat_id, Chat.PRIVATE)
+    return Update(update_id, message=Message(update_id, datetime.now(), chat))
+
+
+def test_updates_of_one_chat_run_in_order():
+    events = []
+
+    async def handle(name, delay):
+        events.append(f'{name} start')
+        await asyncio.sleep(delay)
+        events.append(f'{name} end')
+
+    async def run():
+        processor = ChatOrderedUpdateProcessor(concurrency=4)
+        # Первое обновление дольше второго, но второе ждет его окончания
+        await asyncio.gather(
+            processor.process_update(make_update(1, 100), handle('first', 0.05)),
+            processor.process_update(make_update(2, 100), handle('second', 0)),
+        )
+        return processor
+
+    processor = asyncio.run(run())
+    assert events == ['first start', 'first end', 'second start', 'second end']
+    assert processor.queue_depth == 0 and processor.in_flight == 0
+
+
+def test_different_chats_run_concurrently_up_to_the_limit():
+    running = 0
+    peak = 0
+
+    async def handle():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+
+    async def run(concurrency, chats):
+        processor = ChatOrderedUpdateProcessor(concurrency=concurrency)
+        await asyncio.gather(*(processor.process_update(make_update(chat_id, chat_id), handle())
+                               for chat_id in range(1, chats + 1)))
+
+    asyncio.run(run(concurrency=3, chats=8))
+    assert peak == 3
+
+    peak = 0
+    asyncio.run(run(concurrency=8, chats=8))
+    assert peak == 8
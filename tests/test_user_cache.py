@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from database import Database
+from models import OrderItem, Product, User
+
+
+@pytest.fixture
+def db(db_url):
+    db = Database(db_url)
+    session = db.get_session()
+    session.add(Product(id=1, name_ru='Water', price=10, is_promo=True))
+    session.commit()
+    session.close()
+    yield db
+    db.close()
+
+
+def admin_update(db, telegram_id, **values):
+    """Изменение пользователя мимо Database, как из Flask-Admin"""
+    session = db.get_session()
+    try:
+        session.query(User).filter_by(telegram_id=telegram_id).update(values)
+        session.commit()
+    finally:
+        session.close()
+
+
+def test_cached_identity_expires_after_ttl(db, monkeypatch):
+    monkeypatch.setattr(db.config, 'USER_CACHE_TTL', 0.05)
+    db.set_language(7, 'ru')
+    assert db.get_user_identity(7).language == 'ru'
+
+    admin_update(db, 7, language='uz', is_first_usage=False)
+    time.sleep(0.1)
+    identity = db.get_user_identity(7)
+    assert identity.language == 'uz'
+    assert identity.is_first_usage is False
+
+
+def test_own_changes_update_the_cache(db):
+    db.set_language(7, 'ru')
+    db.get_user_identity(7)
+    db.set_language(7, 'uz')
+    assert db.get_user_identity(7).language == 'uz'
+
+
+def test_order_uses_current_first_order_flag(db):
+    db.set_language(7, 'ru')
+    assert db.get_user_identity(7).is_first_usage is True
+    db.adjust_cart_quantity(7, 1, 1)
+
+    # Кэш еще помнит is_first_usage=True, но бонус первой покупки уже снят в админке
+    admin_update(db, 7, is_first_usage=False)
+    order_id = db.create_order({'user_id': 7, 'name': 'Test', 'phone': '+998', 'address': 'Street'})
+
+    session = db.get_session()
+    try:
+        items = [(item.quantity, item.price) for item in session.query(OrderItem).filter_by(order_id=order_id)]
+    finally:
+        session.close()
+    assert items == [(1, 10)]
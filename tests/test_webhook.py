@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+import webhook
+from webhook import WebhookServer
+
+
+class FakeApplication:
+    """То, что WebhookServer.serve использует у telegram.ext.Application"""
+
+    def __init__(self):
+        self.calls = []
+        self.running = False
+        self.bot = None
+        self.update_queue = asyncio.Queue()
+        self.post_init = self._hook('post_init')
+        self.post_stop = self._hook('post_stop')
+        self.post_shutdown = self._hook('post_shutdown')
+
+    def _hook(self, name):
+        async def hook(application):
+            self.calls.append(name)
+        return hook
+
+    async def __aenter__(self):
+        self.calls.append('initialize')
+        return self
+
+    async def __aexit__(self, *exc):
+        self.calls.append('shutdown')
+
+    async def start(self):
+        self.running = True
+        self.calls.append('start')
+
+    async def stop(self):
+        self.running = False
+        self.calls.append('stop')
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(webhook.config, 'WEBHOOK_REGISTER', True)
+    monkeypatch.setattr(webhook.config, 'WEBHOOK_URL', 'https://shop.example.com/webhook')
+    return WebhookServer(FakeApplication(), listen='127.0.0.1', port=0)
+
+
+def test_registering_without_url_is_a_config_error(server, monkeypatch):
+    monkeypatch.setattr(webhook.config, 'WEBHOOK_URL', '')
+    with pytest.raises(ValueError, match='WEBHOOK_URL'):
+        asyncio.run(server.serve())
+    assert server.application.calls == []
+
+
+def test_post_shutdown_runs_when_set_webhook_fails(server, monkeypatch):
+    async def set_webhook(allowed_updates=None):
+        raise RuntimeError("Telegram is unreachable")
+
+    monkeypatch.setattr(server, 'set_webhook', set_webhook)
+    with pytest.raises(RuntimeError):
+        asyncio.run(server.serve())
+    assert server.application.calls == ['initialize', 'post_init', 'start', 'stop', 'post_stop',
+                                        'shutdown', 'post_shutdown']
+
+
+def test_clean_stop(server, monkeypatch):
+    monkeypatch.setattr(webhook.config, 'WEBHOOK_REGISTER', False)
+    stop_event = asyncio.Event()
+
+    async def run():
+        task = asyncio.create_task(server.serve(stop_event=stop_event))
+        await asyncio.sleep(0.05)
+        stop_event.set()
+        await task
+
+    asyncio.run(run())
+    assert server.application.calls[-2:] == ['shutdown', 'post_shutdown']
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from async_database import AsyncDatabase
+from database import Database
+from models import User
+from write_coalescer import WriteCoalescer
+
+
+@pytest.fixture
+def db(db_url):
+    return Database(db_url)
+
+
+def count_commits(db):
+    commits = []
+    event.listen(db.engine, 'commit', lambda connection: commits.append(1))
+    return commits
+
+
+def test_failed_operation_does_not_fail_the_batch(db, monkeypatch):
+    set_language = db._set_language
+
+    def failing_set_language(session, telegram_id, language):
+        if telegram_id == 2:
+            raise RuntimeError("boom")
+        return set_language(session, telegram_id, language)
+
+    monkeypatch.setattr(db, '_set_language', failing_set_language)
+    commits = count_commits(db)
+
+    async def run():
+        async_db = AsyncDatabase(db, max_workers=0, write_batch=True)
+        return await asyncio.gather(
+            *(async_db.set_language(telegram_id, 'uz') for telegram_id in (1, 2, 3)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], RuntimeError)
+    # Пакет без упавшей операции повторен и закоммичен одной транзакцией
+    assert len(commits) == 1
+    session = db.get_session()
+    try:
+        assert dict(session.query(User.telegram_id, User.language)) == {1: 'uz', 3: 'uz'}
+    finally:
+        session.close()
+
+
+def test_results_are_returned_to_their_callers(db):
+    async def run():
+        async_db = AsyncDatabase(db, max_workers=0, write_batch=True)
+        return await asyncio.gather(
+            async_db.adjust_cart_quantity(1, 10, 3),
+            async_db.adjust_cart_quantity(2, 10, 1),
+            async_db.adjust_cart_quantity(1, 10, -1),
+        )
+
+    assert asyncio.run(run()) == [3, 1, 2]
+
+
+class FailingDatabase:
+    def apply_writes(self, writes):
+        raise RuntimeError("database is down")
+
+
+class FakeAsyncDatabase:
+    def __init__(self, db):
+        self.db = db
+        self.batches = []
+
+    async def run(self, func, writes):
+        self.batches.append(len(writes))
+        return func(writes)
+
+
+def test_batch_failure_is_raised_to_every_caller():
+    async def run():
+        coalescer = WriteCoalescer(FakeAsyncDatabase(FailingDatabase()), window=0.01)
+        return await asyncio.gather(
+            coalescer.submit('set_language', 1, 'ru'),
+            coalescer.submit('set_language', 2, 'ru'),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert [str(result) for result in results] == ["database is down"] * 2
+
+
+def test_batches_are_limited_by_max_batch():
+    class EchoDatabase:
+        def apply_writes(self, writes):
+            return [args[0] for _, args, _ in writes]
+
+    async_db = FakeAsyncDatabase(EchoDatabase())
+
+    async def run():
+        coalescer = WriteCoalescer(async_db, window=0.01, max_batch=2)
+        return await asyncio.gather(*(coalescer.submit('set_language', i, 'ru') for i in range(5)))
+
+    assert asyncio.run(run()) == list(range(5))
+    assert async_db.batches == [2, 2, 1]
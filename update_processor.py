@@ -0,0 +1,150 @@
+import asyncio
+import contextlib
+import contextvars
+import logging
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config import config
+from metrics import registry, track_update
+
+logger = logging.getLogger(__name__)
+
+# Семафор базового класса не должен ничего ограничивать: слоты занимаются
+# в do_process_update уже после очереди чата
+_BASE_CONCURRENCY = 2 ** 30
+
+# Слот, занятый обновлением, которое обрабатывает текущая задача
+_current_slot = contextvars.ContextVar('update_slot', default=None)
+
+
+class _UpdateSlot:
+    """Место в пределах UPDATE_CONCURRENCY, которое обновление может отдать на время ожидания"""
+
+    def __init__(self, processor):
+        self.processor = processor
+        self.task = asyncio.current_task()
+        self.held = False
+
+    async def acquire(self):
+        await self.processor._slots.acquire()
+        self.held = True
+        self.processor._active += 1
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.processor._active -= 1
+            self.processor._slots.release()
+
+
+@contextlib.asynccontextmanager
+async def slot_released():
+    """Отдать слот текущего обновления другим чатам, пока оно ждет (например, лимита отправки).
+
+    Очередь своего чата при этом сохраняется. Вне ChatOrderedUpdateProcessor
+    и в задачах, запущенных из обработчика, ничего не делает.
+    """
+    slot = _current_slot.get()
+    if slot is None or not slot.held or slot.task is not asyncio.current_task():
+        yield
+        return
+    slot.release()
+    try:
+        yield
+    finally:
+        await slot.acquire()
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с сохранением порядка внутри чата.
+
+    Обновления разных чатов обрабатываются одновременно (не больше
+    concurrency), а обновления одного чата - строго по очереди,
+    чтобы переходы состояний ConversationHandler не перепутались.
+    """
+
+    def __init__(self, concurrency: int = None):
+        super().__init__(_BASE_CONCURRENCY)
+        self.concurrency = concurrency or config.UPDATE_CONCURRENCY
+        self._slots = asyncio.Semaphore(self.concurrency)
+        # chat_id -> [lock, число обновлений чата в работе и в очереди]
+        self._chats = {}
+        self._pending = 0
+        self._active = 0
+        self._reporter = None
+
+        registry.gauge('bot_update_queue_depth', 'Updates waiting for their chat or a free slot') \
+            .set_function(lambda: self.queue_depth)
+        registry.gauge('bot_updates_in_flight', 'Updates being handled right now') \
+            .set_function(lambda: self.in_flight)
+
+    @property
+    def queue_depth(self) -> int:
+        """Обновления, ожидающие своей очереди в чате или свободного слота"""
+        return self._pending - self._active
+
+    @property
+    def in_flight(self) -> int:
+        """Обновления, обрабатываемые прямо сейчас"""
+        return self._active
+
+    @staticmethod
+    def _chat_key(update):
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update, coroutine) -> None:
+        # Сначала ждем свою очередь в чате и только потом занимаем слот:
+        # иначе несколько обновлений одного чата держали бы слоты впустую
+        key = self._chat_key(update)
+        self._pending += 1
+        try:
+            if key is None:
+                await self._process(coroutine)
+                return
+
+            entry = self._chats.get(key)
+            if entry is None:
+                entry = self._chats[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    await self._process(coroutine)
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._chats[key]
+        finally:
+            self._pending -= 1
+
+    async def _process(self, coroutine):
+        slot = _UpdateSlot(self)
+        await slot.acquire()
+        token = _current_slot.set(slot)
+        try:
+            await track_update(coroutine)
+        finally:
+            _current_slot.reset(token)
+            slot.release()
+
+    async def _report(self):
+        """Периодический вывод глубины очереди в лог"""
+        while True:
+            await asyncio.sleep(config.UPDATE_QUEUE_REPORT_INTERVAL)
+            if self._pending:
+                logger.info("Update queue depth: %s, in flight: %s, chats: %s", self.queue_depth, self._active, len(self._chats))
+
+    async def initialize(self) -> None:
+        if config.UPDATE_QUEUE_REPORT_INTERVAL > 0 and self._reporter is None:
+            self._reporter = asyncio.create_task(self._report())
+
+    async def shutdown(self) -> None:
+        if self._reporter is not None:
+            self._reporter.cancel()
+            self._reporter = None
@@ -1,10 +1,14 @@
+import atexit
 import functools
 import asyncio
 import logging
 import os
+import queue
+import random
 import sys
 from datetime import datetime, timedelta
 from functools import wraps
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from typing import Callable, Any, Dict
 
 from telegram import Update
@@ -14,27 +18,100 @@ from config import config
 
 logger = logging.getLogger(__name__)
 
+class SamplingFilter(logging.Filter):
+    """Пропускает только долю rate сообщений уровня level и ниже"""
+
+    def __init__(self, rate: float, level: int = logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.level = level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > self.level or random.random() < self.rate
+
+
+# Неизменяемые аргументы, форматирование которых можно отложить
+_SCALAR_ARGS = (str, int, float, bool, bytes, type(None))
+
+
+class LazyQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке.
+
+    Слушатель работает в этом же процессе, поэтому запись со скалярными
+    аргументами кладется в очередь как есть, а сообщение собирается из msg и
+    args уже в потоке слушателя. Списки, словари и прочие объекты могут
+    измениться до этого, поэтому с ними сообщение собирается сразу.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, _SCALAR_ARGS) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+_log_listener = None
+
+
+def _parse_levels(levels: str) -> Dict[str, str]:
+    """Разбор строки вида database=DEBUG,httpx=WARNING"""
+    result = {}
+    for item in levels.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            result[name.strip()] = level.strip().upper()
+    return result
+
+
 def setup_logging():
-    """Настройка логирования"""
-    logging.basicConfig(
-        level=logging.DEBUG,  
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    """Настройка логирования.
+
+    Обработчики пишут в консоль и в файл с ротацией из отдельного потока
+    (QueueListener), а в обработчиках обновлений остается только постановка
+    записи в очередь.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return _log_listener
+
+    formatter = logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
-    
-    # Настройка логгеров для разных модулей
-    loggers = ['__main__', 'database', 'admin', 'telegram', 'httpx']
-    for logger_name in loggers:
-        logger = logging.getLogger(logger_name)
-        logger.setLevel(logging.DEBUG)
-        
-        # Добавляем обработчик для вывода в файл
-        file_handler = logging.FileHandler('bot.log')
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    handlers = [logging.StreamHandler()]
+    if config.LOG_FILE:
+        handlers.append(RotatingFileHandler(
+            config.LOG_FILE,
+            maxBytes=config.LOG_MAX_BYTES,
+            backupCount=config.LOG_BACKUP_COUNT,
+            encoding='utf-8'
         ))
-        logger.addHandler(file_handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    if config.LOG_DEBUG_SAMPLE_RATE < 1:
+        queue_handler.addFilter(SamplingFilter(config.LOG_DEBUG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(config.LOG_LEVEL.upper())
+
+    # Уровни отдельных модулей
+    for name, level in _parse_levels(config.LOG_LEVELS).items():
+        try:
+            logging.getLogger(name).setLevel(level)
+        except ValueError:
+            logger.warning("Unknown log level %s for logger %s", level, name)
+
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    return _log_listener
 
 def rate_limit(limit: float) -> Callable:
     """
@@ -55,7 +132,7 @@ def rate_limit(limit: float) -> Callable:
             if user_id in last_time:
                 elapsed = current_time - last_time[user_id]
                 if elapsed < limit:
-                    logging.debug(f"Rate limit hit for user {user_id} on {func.__name__}")
+                    logging.debug("Rate limit hit for user %s on %s", user_id, func.__name__)
                     await update.message.reply_text(
                         context.bot_data['locales'][context.user_data.get('language', 'ru')]['rate_limit_exceeded']
                     )
@@ -88,8 +165,8 @@ async def retry_on_error(func: Callable, max_retries: int = 3, delay: int = 1):
             return await func()
         except Exception as e:
             if attempt == max_retries - 1:
-                logger.error(f"Failed after {max_retries} attempts: {e}")
+                logger.error("Failed after %s attempts: %s", max_retries, e)
                 raise
-            logger.warning(f"Attempt {attempt + 1} failed: {e}. Retrying in {delay} seconds...")
+            logger.warning("Attempt %s failed: %s. Retrying in %s seconds...", attempt + 1, e, delay)
             await asyncio.sleep(delay)
             delay *= 2  # Экспоненциальная задержка
@@ -0,0 +1,139 @@
+import asyncio
+import hmac
+import logging
+import signal
+import ssl
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """Прием обновлений от Telegram по webhook.
+
+    Обновления приходят POST-запросом на WEBHOOK_PATH и кладутся в
+    application.update_queue, дальше их обрабатывают те же хендлеры, что
+    и при polling. Для локальной проверки достаточно отправить JSON Update
+    на этот адрес (с заголовком секрета, если он задан).
+    """
+
+    def __init__(self, application: Application, listen: str = None, port: int = None,
+                 path: str = None, secret_token: str = None, cert: str = None, key: str = None):
+        self.application = application
+        self.listen = listen or config.WEBHOOK_LISTEN
+        self.port = config.WEBHOOK_PORT if port is None else port
+        self.path = '/' + (config.WEBHOOK_PATH if path is None else path).lstrip('/')
+        self.secret_token = config.WEBHOOK_SECRET if secret_token is None else secret_token
+        self.cert = cert or config.WEBHOOK_CERT
+        self.key = key or config.WEBHOOK_KEY
+
+        self.app = web.Application()
+        self.app.router.add_post(self.path, self.handle_update)
+        self._runner = None
+
+    @property
+    def ssl_context(self):
+        """TLS включается, только если заданы и сертификат, и ключ"""
+        if not (self.cert and self.key):
+            return None
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(self.cert, self.key)
+        return context
+
+    @property
+    def url(self) -> str:
+        """Публичный адрес webhook, по которому Telegram присылает обновления"""
+        return config.WEBHOOK_URL
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.secret_token:
+            received = request.headers.get(SECRET_HEADER, '')
+            if not hmac.compare_digest(received, self.secret_token):
+                logger.warning("Webhook request with invalid secret token from %s", request.remote)
+                return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logger.warning("Invalid webhook payload: %s", e)
+            return web.Response(status=400)
+
+        if update is None:
+            return web.Response(status=400)
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port, ssl_context=self.ssl_context)
+        await site.start()
+        logger.info("Webhook server listening on %s:%s%s", self.listen, self.port, self.path)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def set_webhook(self, allowed_updates=None):
+        """Регистрация адреса в Telegram. Самоподписанный сертификат
+        нужно передать вместе с адресом, иначе Telegram его не примет."""
+        certificate = None
+        if self.cert and self.key:
+            with open(self.cert, 'rb') as f:
+                certificate = f.read()
+        await self.application.bot.set_webhook(
+            url=self.url,
+            certificate=certificate,
+            allowed_updates=allowed_updates,
+            secret_token=self.secret_token or None
+        )
+        logger.info("Webhook set to %s", self.url)
+
+    async def serve(self, allowed_updates=None, stop_event: asyncio.Event = None):
+        """Запуск бота в режиме webhook до получения сигнала остановки"""
+        if config.WEBHOOK_REGISTER and not self.url:
+            # Адрес из WEBHOOK_LISTEN (0.0.0.0) Telegram не примет, поэтому его не угадываем
+            raise ValueError("WEBHOOK_URL is required to register the webhook: set it to the public "
+                             "https address or set WEBHOOK_REGISTER=0")
+
+        stop_event = stop_event or asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        # post_init/post_stop/post_shutdown вызываются так же, как в run_polling:
+        # post_shutdown (запись корзин, закрытие пула БД) - даже если запуск не удался
+        try:
+            async with self.application:
+                if self.application.post_init:
+                    await self.application.post_init(self.application)
+                try:
+                    await self.application.start()
+                    await self.start()
+                    if config.WEBHOOK_REGISTER:
+                        await self.set_webhook(allowed_updates)
+                    await stop_event.wait()
+                finally:
+                    await self.stop()
+                    if self.application.running:
+                        await self.application.stop()
+                        if self.application.post_stop:
+                            await self.application.post_stop(self.application)
+        finally:
+            if self.application.post_shutdown:
+                await self.application.post_shutdown(self.application)
+
+    def run(self, allowed_updates=None):
+        asyncio.run(self.serve(allowed_updates))
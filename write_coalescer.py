@@ -0,0 +1,73 @@
+import asyncio
+import contextvars
+import logging
+
+from config import config
+from metrics import DB_WRITE_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class WriteCoalescer:
+    """Group commit для изменений корзины и языка.
+
+    Операции многих пользователей копятся window секунд (или до max_batch
+    штук) и применяются одной транзакцией через Database.apply_writes - вместо
+    отдельного коммита (и fsync в SQLite) на каждое нажатие ➕/➖.
+    Каждый вызывающий получает свой результат или свое исключение уже после
+    коммита, поэтому следующие чтения видят его запись.
+    Пакеты применяются по одному: пока идет коммит, копится следующий.
+    """
+
+    def __init__(self, async_db, window: float = None, max_batch: int = None):
+        self.async_db = async_db
+        self.window = config.DB_WRITE_BATCH_WINDOW if window is None else window
+        self.max_batch = max_batch or config.DB_WRITE_BATCH_MAX
+        self._pending = []
+        self._full = asyncio.Event()
+        self._task = None
+
+    async def submit(self, name: str, *args, **kwargs):
+        """Поставить операцию Database.<name> в пакет и дождаться ее результата"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((name, args, kwargs, future))
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        if self._task is None:
+            # Задача не должна наследовать контекст первого вызывающего,
+            # иначе SQL-запросы всего пакета попадут в метрики его обновления
+            self._task = contextvars.Context().run(asyncio.create_task, self._flush_loop())
+        return await future
+
+    async def _flush_loop(self):
+        try:
+            while self._pending:
+                if len(self._pending) < self.max_batch:
+                    try:
+                        await asyncio.wait_for(self._full.wait(), self.window)
+                    except asyncio.TimeoutError:
+                        pass
+                self._full.clear()
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                await self._apply(batch)
+        finally:
+            self._task = None
+
+    async def _apply(self, batch):
+        writes = [(name, args, kwargs) for name, args, kwargs, _ in batch]
+        DB_WRITE_BATCH_SIZE.observe(len(writes))
+        try:
+            results = await self.async_db.run(self.async_db.db.apply_writes, writes)
+        except Exception as e:
+            logger.error("Write batch of %s operations failed: %s", len(writes), e)
+            results = [e] * len(writes)
+
+        for (_, _, _, future), result in zip(batch, results):
+            if future.done():
+                # Вызывающий отменил ожидание (например, при остановке бота)
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)